@@ -3,6 +3,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Gemini calls allowed per minute by the organizer (free tier: 15).
+GEMINI_REQUESTS_PER_MINUTE = 15
 # Username for m3u/m3u8 playlists
 USERNAME = os.getenv("USERNAME")
 PASSWORD = os.getenv("PASSWORD")
@@ -15,6 +17,15 @@ ORGANIZER_OUTPUT_FILENAME = "organized_channels.m3u"
 
 RETRY_DELAY = 0.3
 MAX_WORKERS = 800
+# Probes one host may have in flight while channels of other hosts are waiting
+# for a worker. A playlist with a single host still uses every worker. 0 disables.
+MAX_INFLIGHT_PER_HOST = 8
+# Run ffprobe on every alive channel to record codec details in diagnostics/
+# (slower). When False, a successful HTTP probe is enough to mark a channel alive.
+DEEP_PROBE = False
+# Seconds an ALIVE result is reused from output/probe_cache.sqlite3 before the
+# channel is probed again. 0 disables the cache.
+CACHE_TTL = 600
 
 # For m3ufilter.py
 FILTER_KEYWORDS = []  # Example: ["disney +", "espn", "hbo"]
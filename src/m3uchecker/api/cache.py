@@ -2,7 +2,7 @@ import logging
 import os
 import threading
 
-from m3uchecker.health_check import check_channels
+from m3uchecker.health_check import STATUS_ALIVE, check_channels, load_playlist
 from m3uchecker.utils.benchmark_workers import (
     get_fastest_workers as _get_fastest_workers,
     get_last_best_workers as _get_last_best_workers,
@@ -26,13 +26,9 @@ def get_last_best_workers():
 
 
 def _build_m3u_from_results(results):
-    lines = ["#EXTM3U"]
-    for _, url, status, extinf in results:
-        if status == "ALIVE":
-            if extinf:
-                lines.append(extinf)
-            lines.append(url)
-    return "\n".join(lines) + "\n"
+    return b"#EXTM3U\n" + b"".join(
+        entry for _, _, status, entry in results if status is STATUS_ALIVE
+    )
 
 
 def _refresh_cached_playlist():
@@ -41,14 +37,19 @@ def _refresh_cached_playlist():
             logging.warning("PLAYLIST_SOURCE is empty; skipping refresh.")
             return
 
+        channels = load_playlist(PLAYLIST_SOURCE)
+        if channels is None:
+            logging.warning(f"Could not load playlist from {PLAYLIST_SOURCE}.")
+            return
+
         workers = _get_fastest_workers(
-            PLAYLIST_SOURCE,
+            channels,
             REFRESH_RETRY_DELAY,
             REFRESH_MAX_WORKERS,
             REFRESH_DIAGNOSTICS_DIR,
         )
         results = check_channels(
-            PLAYLIST_SOURCE,
+            channels,
             REFRESH_RETRY_DELAY,
             workers,
             REFRESH_DIAGNOSTICS_DIR,
@@ -56,7 +57,7 @@ def _refresh_cached_playlist():
         content = _build_m3u_from_results(results)
 
         tmp_file = f"{FINAL_PLAYLIST_FILE}.tmp"
-        with open(tmp_file, "w", encoding="utf-8") as f:
+        with open(tmp_file, "wb") as f:
             f.write(content)
         os.replace(tmp_file, FINAL_PLAYLIST_FILE)
 
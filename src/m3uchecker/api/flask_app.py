@@ -18,7 +18,7 @@ CACHE_MAX_AGE_SECONDS=86400
 REFRESH_RETRY_DELAY=0.3
 REFRESH_MAX_WORKERS=10
 REFRESH_DIAGNOSTICS_DIR=diagnostics
-BENCHMARK_WORKERS=4,8,10,12,16
+BENCHMARK_WORKERS=16,32,64,128,256,512
 BENCHMARK_CACHE_SECONDS=3600
 DEFAULT_TREE_MAX_DEPTH=5
 """
@@ -40,9 +40,13 @@ def _ensure_env_file():
 
 _ensure_env_file()
 
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flasgger import Swagger
-from m3uchecker.health_check import load_playlist, check_channels
+from m3uchecker.health_check import (
+  STATUS_ALIVE,
+  iter_channel_statuses,
+  load_playlist,
+)
 
 app = Flask(__name__)
 
@@ -133,33 +137,27 @@ def check_channels_api():
         if not source:
             return jsonify({"error": "Invalid playlist source"}), 400
 
-        results = check_channels(source, retry_delay, max_workers, diagnostics_dir)
-
-        alive_channels_details = [r for r in results if r[2] == "ALIVE"]
-
-        if not alive_channels_details:
-            m3u_playlist_content = "#EXTM3U\n"
-            response = Response(
-                m3u_playlist_content, mimetype="application/vnd.apple.mpegurl"
-            )
-            response.headers["Content-Disposition"] = (
-                "attachment; filename=alive_channels.m3u"
-            )
-            return response
-
-        playlist_lines = ["#EXTM3U"]
-        for channel_detail in alive_channels_details:
-            extinf_line = channel_detail[3]
-            channel_url = channel_detail[1]
-
-            if extinf_line:
-                playlist_lines.append(extinf_line)
-            playlist_lines.append(channel_url)
+        channels = load_playlist(source)
+        if channels is None:
+            return jsonify({"error": "Invalid playlist source"}), 400
 
-        m3u_playlist_content = "\n".join(playlist_lines)
+        def generate():
+            # Alive channels are sent as soon as they are confirmed, so the
+            # client sees data (and proxies see traffic) during long scans.
+            yield b"#EXTM3U\n"
+            try:
+                for index, status in iter_channel_statuses(
+                    channels, retry_delay, max_workers, diagnostics_dir
+                ):
+                    if status is STATUS_ALIVE:
+                        yield channels[index].entry
+            except Exception as e:
+                # Headers are already sent; the playlist is just cut short.
+                logging.error(f"Error streaming check_channels_api: {e}")
 
         response = Response(
-            m3u_playlist_content, mimetype="application/vnd.apple.mpegurl"
+            stream_with_context(generate()),
+            mimetype="application/vnd.apple.mpegurl",
         )
         response.headers["Content-Disposition"] = (
             "attachment; filename=alive_channels.m3u"
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3.9
 import os
+import re
 import sys
 from urllib.parse import urlparse
 from pathlib import Path
 
-import requests
-from ipytv import playlist
+from m3uchecker.http import iter_playlist_lines
+from m3uchecker.m3u import iter_m3u
 
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 
@@ -22,31 +23,9 @@ OUTPUT_DIR.mkdir(exist_ok=True)
 def load_playlist(source):
     try:
         if urlparse(source).scheme in ("http", "https"):
-            resp = requests.get(source)
-            resp.raise_for_status()
-            playlist_content = resp.text
-            pl = playlist.loads(playlist_content)
-            original_lines = playlist_content.splitlines()
-        else:
-            with open(source, "r", encoding="utf-8") as f:
-                playlist_content = f.read()
-            pl = playlist.loadf(source)
-            original_lines = playlist_content.splitlines()
-
-        url_to_extinf = {}
-        current_extinf = None
-        for line in original_lines:
-            if line.startswith("#EXTINF"):
-                current_extinf = line
-            elif line and not line.startswith("#") and current_extinf:
-                url_to_extinf[line] = current_extinf
-                current_extinf = None
-
-        for ch in pl.get_channels():
-            ch.original_extinf = url_to_extinf.get(ch.url, None)
-            ch.extgrp = getattr(ch, "extgrp", None)
-
-        return pl
+            return list(iter_m3u(iter_playlist_lines(source)))
+        with open(source, "r", encoding="utf-8") as f:
+            return list(iter_m3u(f))
     except FileNotFoundError:
         print(f"Error: File not found: {source}")
     except Exception as e:
@@ -88,50 +67,26 @@ def filter_channels(channels, keywords):
     if not keywords:
         return []
 
-    matched = []
-    for ch in channels:
-        name_lower = ch.name.lower() if ch.name else ""
-        group_lower = ""
-        group = getattr(ch, "group_title", None) or getattr(ch, "group", None) or ""
-        group_lower = group.lower()
+    # Lowercase each channel once. The NUL separator keeps a keyword from
+    # matching across the name/group boundary while allowing one search.
+    haystacks = [
+        (f"{(ch.name or '').lower()}\0{(ch.group_title or '').lower()}", ch)
+        for ch in channels
+    ]
 
-        for keyword in keywords:
-            if keyword in name_lower or keyword in group_lower:
-                matched.append(ch)
-
-    return matched
+    # One compiled alternation finds any keyword in a single scan of each
+    # haystack instead of one substring search per keyword.
+    pattern = re.compile("|".join(map(re.escape, keywords)))
+    return [ch for haystack, ch in haystacks if pattern.search(haystack)]
 
 
 def write_filtered_m3u(filename, channels):
     filepath = os.path.join(OUTPUT_DIR, filename)
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write("#EXTM3U\n")
-        for ch in channels:
-            extinf = getattr(ch, "original_extinf", None)
-            extgrp = getattr(ch, "extgrp", None)
-
-            if extinf:
-                f.write(f"{extinf}\n")
-            else:
-                extinf_attrs = []
-                if hasattr(ch, "tvg_id") and ch.tvg_id:
-                    extinf_attrs.append(f'tvg-id="{ch.tvg_id}"')
-                if hasattr(ch, "tvg_name") and ch.tvg_name:
-                    extinf_attrs.append(f'tvg-name="{ch.tvg_name}"')
-                if hasattr(ch, "tvg_logo") and ch.tvg_logo:
-                    extinf_attrs.append(f'tvg-logo="{ch.tvg_logo}"')
-                group = (
-                    getattr(ch, "group_title", None) or getattr(ch, "group", None) or ""
-                )
-                if group:
-                    extinf_attrs.append(f'group-title="{group}"')
-                extinf_str = " ".join(extinf_attrs)
-                f.write(f"#EXTINF:-1 {extinf_str},{ch.name}\n")
-
-            if extgrp:
-                f.write(f"#EXTGRP:{extgrp}\n")
-
-            f.write(f"{ch.url}\n")
+    # Each channel carries its preformatted #EXTINF/#EXTGRP/URL bytes, handed
+    # to the buffered writer in a single writelines call.
+    with open(filepath, "wb", buffering=1 << 20) as f:
+        f.write(b"#EXTM3U\n")
+        f.writelines(ch.entry for ch in channels)
 
     return filepath
 
@@ -145,12 +100,11 @@ def main():
         return
 
     print(f"Loading playlist from: {source}")
-    pl = load_playlist(source)
-    if not pl:
+    channels = load_playlist(source)
+    if channels is None:
         print("Failed to load playlist.")
         return
 
-    channels = pl.get_channels()
     print(f"Loaded {len(channels)} channels.\n")
 
     keywords = get_keywords()
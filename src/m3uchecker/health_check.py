@@ -1,14 +1,42 @@
 #!/usr/bin/env python3.9
+import atexit
+import base64
+import hashlib
+import json
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from ipytv import playlist
+from logging.handlers import QueueHandler, QueueListener
+import mmap
+import queue
+import threading
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
 import requests
+from requests.adapters import HTTPAdapter
+import re
+import shutil
 import sys
-from urllib.parse import urlparse
+from functools import lru_cache
+from urllib.parse import urlparse, urlsplit
 import time
 import os
 from pathlib import Path
 
+from m3uchecker.http import PLAYLIST_CHUNK_BYTES, PLAYLIST_TIMEOUT, USER_AGENT
+from m3uchecker.http import SESSION as PLAYLIST_SESSION
+from m3uchecker.m3u import iter_m3u, iter_m3u_bytes
+from m3uchecker.utils import dns_cache, probe_cache
+
+try:
+    import av
+except ImportError:
+    av = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 
 try:
@@ -17,17 +45,114 @@ try:
 except ImportError:
     config = None
 
-logging.basicConfig(
-    filename=PROJECT_ROOT / "m3u_checker.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
+# Worker threads only enqueue log records; one listener thread owns the file,
+# so probes never wait on the handler lock or on disk.
+_log_queue = queue.SimpleQueue()
+_log_file_handler = logging.FileHandler(PROJECT_ROOT / "m3u_checker.log")
+_log_file_handler.setFormatter(
+    logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
 )
+_log_listener = QueueListener(_log_queue, _log_file_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+
+STATUS_ALIVE = sys.intern("ALIVE")
+STATUS_UNSTABLE = sys.intern("UNSTABLE")
+STATUS_DEAD = sys.intern("DEAD")
+# One byte per channel while checking; index = code.
+_STATUS_NAMES = (STATUS_DEAD, STATUS_UNSTABLE, STATUS_ALIVE)
+_STATUS_CODES = {status: code for code, status in enumerate(_STATUS_NAMES)}
+
+# One checked channel; `entry` is its ready-to-write #EXTINF/#EXTGRP/URL bytes.
+CheckResult = namedtuple("CheckResult", ("name", "url", "status", "entry"))
 
 TIMEOUT = 10
-RETRIES = 10
+RETRIES = 3
+PROBE_TIMEOUT = 3
+# Slightly above a multiple of 3 s, the TCP SYN retransmission interval.
+PROBE_CONNECT_TIMEOUT = 3.05
+PROBE_DRAIN_BYTES = 4096
+PROBE_HEAD_BYTES = 1024
+HOST_FAILURE_LIMIT = 20
+MAX_INFLIGHT_PER_HOST = (
+    int(getattr(config, "MAX_INFLIGHT_PER_HOST", 8) or 0) if config else 8
+)
+CACHE_TTL = int(getattr(config, "CACHE_TTL", 600) or 0) if config else 600
 
 OUTPUT_DIR = PROJECT_ROOT / "output"
 OUTPUT_DIR.mkdir(exist_ok=True)
+PROBE_CACHE_PATH = OUTPUT_DIR / "probe_cache.sqlite3"
+
+# Stop probing after ~0.5 s / 200 kB of stream instead of ffmpeg's 5 s / 5 MB.
+# Plenty to prove a stream is decodable; only used when codecs aren't wanted.
+QUICK_PROBE_OPTIONS = {
+    "analyzeduration": "500000",
+    "probesize": "200000",
+    "fflags": "nobuffer",
+}
+# Absolute path resolved once, so each probe skips the PATH search.
+FFPROBE = shutil.which("ffprobe") or "ffprobe"
+
+# Probes are I/O-bound, so scale well past the CPU count, but keep small VMs
+# from drowning in threads and sockets.
+_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+DEFAULT_MAX_WORKERS = min(256, (_CPUS or 1) * 16)
+
+POOL_MAXSIZE = (
+    int(getattr(config, "MAX_WORKERS", None) or DEFAULT_MAX_WORKERS)
+    if config
+    else DEFAULT_MAX_WORKERS
+)
+
+# Shared keep-alive session: requests to the same host reuse pooled sockets
+# instead of paying a new TCP/TLS handshake on every call. Probes keep their
+# own retry policy, so they don't use the playlist session in
+# m3uchecker.http, whose adapter retries every request.
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": USER_AGENT, "Connection": "keep-alive"})
+_adapter = HTTPAdapter(
+    pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE, pool_block=False
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# HLS manifest content types, matched in one scan of the header value.
+_MANIFEST_CT_RE = re.compile(r"vnd\.apple\.mpegurl|x-mpegurl|audio/mpegurl")
+# Media content types that, with a non-empty first chunk, prove a live stream.
+_STREAM_CT_RE = re.compile(r"video/|audio/|mp2t|octet-stream")
+# ffprobe errors that no retry will fix: NXDOMAIN, refused connections, 4xx
+# responses and payloads that are not media. Timeouts and TLS errors are
+# still retried.
+_HARD_FAIL_RE = re.compile(
+    r"Name or service not known|Connection refused"
+    r"|Server returned 4(?:\d\d|XX)|HTTP error 4\d\d"
+    r"|Invalid data found when processing input"
+)
+# ffprobe giving up on a stalled socket itself (-rw_timeout): as unstable as
+# hitting the subprocess timeout, and left to the longer-timeout retest.
+_TIMED_OUT_RE = re.compile(r"timed out|ETIMEDOUT", re.I)
+
+# Maps diagnostics file names back to channel URLs, one JSON line per file.
+DIAGNOSTICS_MANIFEST = "manifest.jsonl"
+
+
+# source -> (validator, channels), least recently used first; see
+# load_playlist. The API accepts arbitrary sources, so only a few are kept.
+PLAYLIST_CACHE_SIZE = 4
+_playlist_cache = OrderedDict()
+_playlist_cache_lock = threading.Lock()
+
+_diag_queue = queue.Queue()
+_diag_writer = None
+_diag_writer_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1 << 16)
+def _split_url(url):
+    # DNS prefetch, probe coalescing, the per-host semaphore and the HTTP
+    # probe all need parts of the same URL; parse each one once.
+    return urlsplit(url)
 
 
 def get_retry_delay():
@@ -38,52 +163,76 @@ def get_retry_delay():
     return float(user_input)
 
 
+def get_need_codec_info():
+    return bool(getattr(config, "DEEP_PROBE", False)) if config else False
+
+
 def get_max_workers():
     workers = getattr(config, "MAX_WORKERS", None) if config else None
     if workers is not None:
         return int(workers)
     user_input = input(
-        "Enter concurrency (number of parallel checks, e.g., 50): "
+        f"Enter concurrency (number of parallel checks, default {DEFAULT_MAX_WORKERS}): "
     ).strip()
-    return int(user_input)
+    return int(user_input) if user_input else DEFAULT_MAX_WORKERS
 
 
 def handle_dead_channel(name, url):
     try:
-        logging.info(f"Handling dead channel: {name} ({url})")
-        return "DEAD"
+        logging.debug(f"Handling dead channel: {name} ({url})")
+        return STATUS_DEAD
     except Exception as e:
         logging.error(f"Error handling dead channel: {e}")
         return "ERROR"
 
 
 def load_playlist(source):
+    """Parse `source` into a list of channels, or return None on failure.
+
+    Parsed playlists are memoised per source and reused while the file's
+    mtime/size, or the server's ETag/Last-Modified, are unchanged.
+    """
     try:
+        with _playlist_cache_lock:
+            cached = _playlist_cache.get(source)
+            if cached:
+                _playlist_cache.move_to_end(source)
         if urlparse(source).scheme in ("http", "https"):
-            resp = requests.get(source)
-            resp.raise_for_status()
-            playlist_content = resp.text
-            pl = playlist.loads(playlist_content)
-            original_lines = playlist_content.splitlines()
+            headers = {}
+            if cached:
+                etag, last_modified = cached[0]
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+            with PLAYLIST_SESSION.get(
+                source, headers=headers, stream=True, timeout=PLAYLIST_TIMEOUT
+            ) as resp:
+                if cached and resp.status_code == 304:
+                    return list(cached[1])
+                resp.raise_for_status()
+                validator = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+                resp.encoding = resp.encoding or "utf-8"
+                lines = resp.iter_lines(chunk_size=PLAYLIST_CHUNK_BYTES, decode_unicode=True)
+                channels = list(iter_m3u(lines))
         else:
-            with open(source, "r", encoding="utf-8") as f:
-                playlist_content = f.read()
-            pl = playlist.loadf(source)
-            original_lines = playlist_content.splitlines()
-        url_to_extinf = {}
-        current_extinf = None
-        for line in original_lines:
-            if line.startswith("#EXTINF"):
-                current_extinf = line
-            elif line and not line.startswith("#") and current_extinf:
-                url_to_extinf[line] = current_extinf
-                current_extinf = None
-        for ch in pl.get_channels():
-            ch.original_extinf = url_to_extinf.get(
-                ch.url, getattr(ch, "original_extinf", None)
-            )
-            ch.extgrp = getattr(ch, "extgrp", None)
-        return pl
+            with open(source, "rb") as f:
+                st = os.fstat(f.fileno())
+                validator = (st.st_mtime_ns, st.st_size)
+                if cached and cached[0] == validator:
+                    return list(cached[1])
+                if st.st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        channels = list(iter_m3u_bytes(data))
+                else:
+                    channels = []
+        if any(validator):
+            with _playlist_cache_lock:
+                _playlist_cache[source] = (validator, channels)
+                _playlist_cache.move_to_end(source)
+                while len(_playlist_cache) > PLAYLIST_CACHE_SIZE:
+                    _playlist_cache.popitem(last=False)
+        return list(channels)
     except FileNotFoundError:
         logging.error(f"File not found: {source}")
     except Exception as e:
@@ -105,14 +254,185 @@ def get_playlist_source():
         return None
 
 
-def get_channel_status(url, retry_delay, diagnostics_dir=None, timeout_override=None):
+def load_json(data):
+    """Parse JSON from bytes, with orjson when it is installed."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_json(obj):
+    """Serialise `obj` as indented UTF-8 JSON bytes."""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2).encode("utf-8")
+
+
+def _diagnostics_writer():
+    # Single consumer, so probe threads never block on disk I/O.
+    created_dirs = set()
+    listed_paths = set()
+    while True:
+        path, diagnostics, url = _diag_queue.get()
+        try:
+            directory = os.path.dirname(path)
+            if directory not in created_dirs:
+                os.makedirs(directory, exist_ok=True)
+                created_dirs.add(directory)
+            with open(path, "wb") as f:
+                f.write(dump_json(diagnostics))
+            if path not in listed_paths:
+                manifest = os.path.join(directory, DIAGNOSTICS_MANIFEST)
+                with open(manifest, "a", encoding="utf-8") as f:
+                    entry = {"file": os.path.basename(path), "url": url}
+                    f.write(json.dumps(entry) + "\n")
+                listed_paths.add(path)
+        except Exception as e:
+            logging.error(f"Error writing diagnostics {path}: {e}")
+        finally:
+            _diag_queue.task_done()
+
+
+def queue_diagnostics(path, diagnostics, url=None):
+    global _diag_writer
+    with _diag_writer_lock:
+        if _diag_writer is None:
+            _diag_writer = threading.Thread(target=_diagnostics_writer, daemon=True)
+            _diag_writer.start()
+    _diag_queue.put((path, diagnostics, url))
+
+
+def flush_diagnostics():
+    _diag_queue.join()
+
+
+class _HostFailures:
+    """Consecutive connection failures per host during one checking run.
+
+    Each run gets its own instance, so concurrent runs (the API refresh and
+    a streamed check) never reset or trip each other's counts.
+    """
+
+    def __init__(self):
+        self._failures = {}  # host -> (consecutive failures, last failure status)
+        self._lock = threading.Lock()
+
+    def tripped(self, host):
+        """Return the status to report without probing, or None to probe.
+
+        A host that kept timing out may just be slow to accept connections,
+        so its channels stay UNSTABLE (and are retested); one that kept
+        refusing them is DEAD.
+        """
+        with self._lock:
+            count, status = self._failures.get(host, (0, None))
+        return status if count > HOST_FAILURE_LIMIT else None
+
+    def record(self, host, failure=None):
+        """Count a connection failure reported as `failure`, or reset on success."""
+        with self._lock:
+            if failure:
+                count = self._failures.get(host, (0, None))[0]
+                self._failures[host] = (count + 1, failure)
+            else:
+                self._failures.pop(host, None)
+
+
+def http_probe(url, timeout=None, host_failures=None):
+    """Cheap ranged GET run before ffprobe.
+
+    Returns a (status, diagnostics) pair. The status is "DEAD" when the
+    channel is clearly gone (connection failure, HTTP error, HTML error
+    page), "ALIVE" when the first bytes already prove a stream (an HLS
+    manifest or MPEG-TS packets), "UNSTABLE" when the host did not accept
+    the connection in time, and None when ffprobe should decide.
+    After more than HOST_FAILURE_LIMIT consecutive connection failures to a host,
+    every remaining channel on that host is reported without a request:
+    UNSTABLE if the last failure was a connect timeout, DEAD otherwise.
+    `timeout` overrides both the connect and read timeouts (used on retest).
+    `host_failures` is the run's _HostFailures; without one, every call
+    starts from a clean slate.
+    """
+    if host_failures is None:
+        host_failures = _HostFailures()
+    try:
+        parsed = _split_url(url)
+    except ValueError:
+        return None, None
+    if parsed.scheme not in ("http", "https"):
+        return None, None
+    host = parsed.netloc
+    tripped_status = host_failures.tripped(host)
+    if tripped_status:
+        return tripped_status, None
+    try:
+        with SESSION.get(
+            url,
+            headers={"Range": f"bytes=0-{PROBE_HEAD_BYTES - 1}"},
+            timeout=(timeout or PROBE_CONNECT_TIMEOUT, timeout or PROBE_TIMEOUT),
+            stream=True,
+        ) as resp:
+            status_code = resp.status_code
+            content_type = resp.headers.get("Content-Type", "").lower()
+            head = b""
+            if status_code < 400:
+                try:
+                    head = next(resp.iter_content(PROBE_HEAD_BYTES), b"")
+                except (requests.ConnectionError, requests.Timeout):
+                    # The host answered but the body stalled; requests raises
+                    # a read timeout while streaming as ConnectionError.
+                    # Neither proves the channel dead, so let ffprobe decide.
+                    return None, None
+            # Closing a partially read response drops its socket. Short
+            # bodies (a ranged 206, an error page) are drained instead so
+            # the keep-alive connection goes back to the pool for the next
+            # channel on this host; unbounded live streams are still dropped.
+            length = resp.headers.get("Content-Length", "")
+            if length.isdigit() and int(length) <= PROBE_DRAIN_BYTES:
+                resp.content
+    except requests.ConnectTimeout:
+        # ffprobe would only wait on the same unreachable host, retries and all.
+        host_failures.record(host, STATUS_UNSTABLE)
+        return STATUS_UNSTABLE, None
+    except requests.Timeout:
+        return None, None
+    except (requests.exceptions.SSLError, requests.exceptions.ProxyError):
+        # Both subclass ConnectionError but say nothing about the stream:
+        # ffprobe doesn't verify certificates, so a self-signed or expired
+        # one still plays. Let ffprobe decide, and don't blame the host.
+        return None, None
+    except requests.ConnectionError:
+        host_failures.record(host, STATUS_DEAD)
+        return STATUS_DEAD, None
+    except requests.RequestException:
+        return None, None
+    host_failures.record(host)
+    if status_code >= 400 and status_code not in (405, 416):
+        return STATUS_DEAD, None
+    if content_type.startswith("text/html"):
+        return STATUS_DEAD, None
+    stream_format = None
+    if _MANIFEST_CT_RE.search(content_type):
+        if head.lstrip().startswith(b"#EXTM3U"):
+            stream_format = "hls"
+    elif len(head) > 188 and head[0] == 0x47 and head[188] == 0x47:
+        stream_format = "mpegts"
+    elif head and _STREAM_CT_RE.search(content_type):
+        stream_format = "media"
+    if stream_format:
+        return STATUS_ALIVE, {
+            "probe": "http",
+            "content_type": content_type,
+            "format": stream_format,
+        }
+    return None, None
+
+
+def _ffprobe_attempt(url, video_only, timeout, quick=False):
     import subprocess
-    import json
-    import os
 
-    headers = {"User-Agent": "VLC/3.0.11 LibVLC/3.0.11"}
-    base_cmd = [
-        "ffprobe",
+    cmd = [
+        FFPROBE,
         "-v",
         "error",
         "-show_entries",
@@ -120,153 +440,393 @@ def get_channel_status(url, retry_delay, diagnostics_dir=None, timeout_override=
         "-print_format",
         "json",
         "-user_agent",
-        headers["User-Agent"],
+        USER_AGENT,
+        # Let ffprobe give up on a stalled socket itself and exit cleanly;
+        # the subprocess timeout below is only a safety net.
+        "-rw_timeout",
+        str(int(timeout * 1_000_000)),
         url,
     ]
-    probe_variants = [["-select_streams", "v:0"], []]
+    if video_only:
+        cmd[3:3] = ["-select_streams", "v:0"]
+    if quick:
+        for option, value in QUICK_PROBE_OPTIONS.items():
+            cmd[-5:-5] = [f"-{option}", value]
+    try:
+        # Our descriptors are non-inheritable (PEP 446), so close_fds is not
+        # needed; without it CPython can posix_spawn/vfork instead of fork
+        # and copy the page tables of a process running hundreds of threads.
+        ffprobe_result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout + 2,
+            close_fds=False,
+        )
+    except subprocess.TimeoutExpired:
+        return STATUS_UNSTABLE, None, ""
+    if ffprobe_result.returncode != 0:
+        error = ffprobe_result.stderr.decode(errors="replace")
+        if _TIMED_OUT_RE.search(error):
+            return STATUS_UNSTABLE, None, error
+        return None, None, error
+    try:
+        diagnostics = load_json(ffprobe_result.stdout)
+    except ValueError:
+        diagnostics = None
+    return STATUS_ALIVE, diagnostics, ""
+
+
+def _pyav_attempt(url, video_only, timeout, quick=False):
+    # Same contract as _ffprobe_attempt, without the fork/exec per probe.
+    options = {"user_agent": USER_AGENT}
+    if quick:
+        options.update(QUICK_PROBE_OPTIONS)
+    try:
+        container = av.open(url, timeout=timeout, options=options)
+    except av.error.ExitError:
+        return STATUS_UNSTABLE, None, ""
+    except av.error.FFmpegError as e:
+        if _TIMED_OUT_RE.search(str(e)):
+            return STATUS_UNSTABLE, None, str(e)
+        return None, None, str(e)
+    try:
+        streams = []
+        for stream in container.streams:
+            if video_only and stream.type != "video":
+                continue
+            info = {"codec_name": stream.codec_context.name}
+            if stream.type == "video":
+                info["width"] = stream.codec_context.width
+                info["height"] = stream.codec_context.height
+            streams.append(info)
+    finally:
+        container.close()
+    return STATUS_ALIVE, {"streams": streams}, ""
+
+
+def diagnostics_name(url):
+    """Fixed-length, filesystem-safe, collision-resistant name for `url`.
+
+    16 base32 characters of a 80-bit blake2b digest; DIAGNOSTICS_MANIFEST
+    in the same directory maps each name back to its URL.
+    """
+    digest = hashlib.blake2b(url.encode(), digest_size=10).digest()
+    return base64.b32encode(digest).decode("ascii").lower()
+
+
+def _save_diagnostics(diagnostics_dir, url, diagnostics):
+    if diagnostics_dir and diagnostics is not None:
+        diag_path = os.path.join(diagnostics_dir, f"{diagnostics_name(url)}.json")
+        queue_diagnostics(diag_path, diagnostics, url)
+
+
+def _host_key(url):
+    try:
+        return _split_url(url).netloc.lower()
+    except ValueError:
+        return url
+
+
+def get_channel_status(
+    url,
+    retry_delay,
+    diagnostics_dir=None,
+    timeout_override=None,
+    need_codec_info=False,
+    use_cache=True,
+    host_failures=None,
+):
+    if use_cache:
+        status, diagnostics = probe_cache.check_cache(url, CACHE_TTL)
+        # A hit from the HTTP probe carries no codec details.
+        if status and not (
+            need_codec_info and (not diagnostics or diagnostics.get("probe") == "http")
+        ):
+            return sys.intern(status)
+    status, diagnostics = _probe_channel(
+        url, retry_delay, timeout_override, need_codec_info, host_failures
+    )
+    _save_diagnostics(diagnostics_dir, url, diagnostics)
+    # Only proven streams are cached; dead and timed-out channels are
+    # re-probed every run in case the outage was transient.
+    if use_cache and status == STATUS_ALIVE:
+        probe_cache.store_result(url, status, diagnostics)
+    return status
+
+
+def _probe_channel(
+    url, retry_delay, timeout_override, need_codec_info, host_failures
+):
+    http_status, http_diagnostics = http_probe(url, timeout_override, host_failures)
+    if http_status == STATUS_DEAD:
+        return handle_dead_channel(url, url), None
+    if http_status == STATUS_UNSTABLE:
+        return http_status, None
+    # The HTTP probe proves liveness; ffprobe only adds codec details.
+    if http_status == STATUS_ALIVE and not need_codec_info:
+        return http_status, http_diagnostics
+
+    probe_attempt = _pyav_attempt if av else _ffprobe_attempt
     actual_timeout = timeout_override if timeout_override else 7
-    for variant in probe_variants:
-        cmd = base_cmd.copy()
-        cmd[3:3] = variant
+    status = None
+    for attempt in range(RETRIES):
+        status, diagnostics, error = probe_attempt(
+            url, attempt == 0, actual_timeout, not need_codec_info
+        )
+        if status == STATUS_ALIVE:
+            return status, diagnostics
+        if status or _HARD_FAIL_RE.search(error):
+            break
+        if retry_delay > 0 and attempt < RETRIES - 1:
+            time.sleep(retry_delay * 2**attempt)
+    if http_status == STATUS_ALIVE:
+        return http_status, http_diagnostics
+    if status:
+        return status, None
+    return handle_dead_channel(url, url), None
+
+
+_DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+
+
+def _url_key(url):
+    """Key under which equivalent spellings of one stream URL are probed once.
+
+    Scheme and host are case-insensitive, a default port is redundant and
+    the fragment is never sent to the server; credentials, path and query
+    are kept as-is.
+    """
+    try:
+        parts = _split_url(url.strip())
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    # Credentials in the userinfo part stay case-sensitive.
+    userinfo, at, hostport = parts.netloc.rpartition("@")
+    hostport = hostport.lower()
+    default_port = _DEFAULT_PORTS.get(scheme)
+    if default_port and hostport.endswith(default_port):
+        hostport = hostport[: -len(default_port)]
+    return f"{scheme}://{userinfo}{at}{hostport}{parts.path or '/'}?{parts.query}"
+
+
+def _prefetch_hosts(channels):
+    default_ports = {"http": 80, "https": 443}
+    host_ports = set()
+    for ch in channels:
         try:
-            ffprobe_result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=actual_timeout,
-            )
-        except subprocess.TimeoutExpired:
-            return "UNSTABLE"
-        if ffprobe_result.returncode == 0:
+            parsed = _split_url(ch.url)
+        except ValueError:
+            continue
+        if parsed.scheme in default_ports and parsed.hostname:
+            try:
+                port = parsed.port or default_ports[parsed.scheme]
+            except ValueError:
+                continue
+            host_ports.add((parsed.hostname, port))
+    dns_cache.prefetch(host_ports)
+
+
+def iter_channel_statuses(
+    channels,
+    retry_delay,
+    max_workers,
+    diagnostics_dir=None,
+    need_codec_info=False,
+    use_cache=True,
+    timeout_override=None,
+    executor=None,
+):
+    """Yield (index, status) for each channel as soon as its probe finishes.
+
+    Results arrive in completion order, so callers can stream them out
+    while the rest of the playlist is still being checked. Channels that
+    share a URL (see _url_key) are probed once and all receive that
+    probe's status.
+
+    `executor` lets a caller share one long-lived pool across runs; it
+    must have at least `max_workers` threads and is left running.
+    """
+    total = len(channels)
+    if not total:
+        return
+    if use_cache and CACHE_TTL > 0:
+        probe_cache.open_cache(PROBE_CACHE_PATH)
+        probe_cache.prefetch(CACHE_TTL)
+    host_failures = _HostFailures()
+    _prefetch_hosts(channels)
+
+    # Each probe is an ffprobe subprocess the worker thread just waits on,
+    # so never spawn more threads than there are channels to wait for.
+    workers = min(max_workers, total)
+    if executor is None:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        window = workers * 2
+    else:
+        # The shared pool may be larger, so the window alone has to cap
+        # the number of probes running at once.
+        pool = nullcontext(executor)
+        window = workers
+    pending = enumerate(channels)
+    inflight = {}  # future -> (url key, host)
+    waiting = {}  # url key -> indexes of the channels awaiting its probe
+    resolved = {}  # url key -> status, for duplicates met after the probe ended
+    per_host = Counter()  # host -> probes in flight
+    held = {}  # host -> deque of (url key, url) held back while the host is busy
+    held_count = 0
+    try:
+        with pool as executor:
+
+            def submit(key, url, host):
+                future = executor.submit(
+                    get_channel_status,
+                    url,
+                    retry_delay,
+                    diagnostics_dir,
+                    timeout_override,
+                    need_codec_info,
+                    use_cache,
+                    host_failures,
+                )
+                inflight[future] = (key, host)
+                per_host[host] += 1
+
+            def release(host):
+                nonlocal held_count
+                backlog = held[host]
+                key, url = backlog.popleft()
+                held_count -= 1
+                if not backlog:
+                    del held[host]
+                submit(key, url, host)
+
+            def refill():
+                # Only keep a window of futures alive so memory stays O(workers)
+                # no matter how large the playlist is. Returns the duplicates of
+                # URLs that were already probed this run.
+                nonlocal held_count
+                ready = []
+                while len(inflight) < window:
+                    item = next(pending, None)
+                    if item is None:
+                        break
+                    index, ch = item
+                    key = _url_key(ch.url)
+                    if key in resolved:
+                        ready.append((index, resolved[key]))
+                    elif key in waiting:
+                        waiting[key].append(index)
+                    else:
+                        waiting[key] = [index]
+                        host = _host_key(ch.url)
+                        # Give other hosts' channels the slot instead, so one
+                        # slow or failing origin cannot take the whole pool.
+                        if (
+                            MAX_INFLIGHT_PER_HOST
+                            and per_host[host] >= MAX_INFLIGHT_PER_HOST
+                            and held_count < window
+                        ):
+                            held.setdefault(host, deque()).append((key, ch.url))
+                            held_count += 1
+                        else:
+                            submit(key, ch.url, host)
+                # No other host has work left to start (or too much is held
+                # back): let busy hosts use the idle slots rather than cap a
+                # single-provider playlist at MAX_INFLIGHT_PER_HOST.
+                while held and len(inflight) < window:
+                    release(next(iter(held)))
+                return ready
+
+            ready = refill()
             try:
-                diagnostics = json.loads(ffprobe_result.stdout.decode())
-                if diagnostics_dir:
-                    os.makedirs(diagnostics_dir, exist_ok=True)
-                    safe_url = url.replace("/", "_").replace(":", "_").replace("?", "_")
-                    diag_path = os.path.join(diagnostics_dir, f"{safe_url}.json")
-                    with open(diag_path, "w") as f:
-                        json.dump(diagnostics, f, indent=2)
-            except:
-                pass
-            return "ALIVE"
-        if retry_delay > 0:
-            time.sleep(retry_delay)
-    return handle_dead_channel(url, url)
-
-
-def check_channels(source, retry_delay, max_workers, diagnostics_dir=None):
+                while ready or inflight:
+                    yield from ready
+                    if not inflight:
+                        break
+                    done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    finished = []
+                    for future in done:
+                        key, host = inflight.pop(future)
+                        per_host[host] -= 1
+                        if host in held and per_host[host] < MAX_INFLIGHT_PER_HOST:
+                            release(host)
+                        status = resolved[key] = future.result()
+                        finished.extend(
+                            (index, status) for index in waiting.pop(key)
+                        )
+                    ready = finished + refill()
+            finally:
+                # Reached early when the consumer stops iterating (a client
+                # that disconnected, a benchmark run past its deadline): drop
+                # the probes that haven't started, and let a shared pool
+                # finish the rest before its next run.
+                for future in inflight:
+                    future.cancel()
+                if inflight:
+                    wait(inflight)
+    finally:
+        probe_cache.flush()
+        flush_diagnostics()
+
+
+def check_channels(
+    channels,
+    retry_delay,
+    max_workers,
+    diagnostics_dir=None,
+    need_codec_info=False,
+    use_cache=True,
+    timeout_override=None,
+    executor=None,
+):
     try:
-        pl = load_playlist(source)
-        if not pl:
-            return []
-        channels = pl.get_channels()
         total = len(channels)
-        results = []
+        statuses = bytearray(total)
+        checked = 0
         dead_count = 0
-        timeout_samples = []
-        avg_timeout = [8]
-        timeout_buffer = 3
-        initial_timeout = 10
-        batch_size = min(25, max(10, total // 10))
-        alive_since_last_avg = 0
-
-        def is_channel_alive(
-            url, retry_delay, diagnostics_dir=None, timeout_override=None
+        alive_since_last_log = 0
+
+        for index, status in iter_channel_statuses(
+            channels,
+            retry_delay,
+            max_workers,
+            diagnostics_dir,
+            need_codec_info,
+            use_cache,
+            timeout_override,
+            executor,
         ):
-            return get_channel_status(
-                url, retry_delay, diagnostics_dir, timeout_override
-            )
-
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            for i in range(0, total, batch_size):
-                batch_channels = channels[i : i + batch_size]
-                futures = {
-                    executor.submit(
-                        is_channel_alive,
-                        ch.url,
-                        retry_delay,
-                        diagnostics_dir,
-                        None,
-                    ): ch
-                    for ch in batch_channels
-                }
-
-                for future in as_completed(futures):
-                    ch = futures[future]
-                    t0 = time.time()
-                    status = future.result()
-                    t1 = time.time()
-                    if status == "ALIVE":
-                        timeout_samples.append(t1 - t0)
-                        alive_since_last_avg += 1
-                    results.append((ch.name, ch.url, status))
-                    if status == "DEAD":
-                        dead_count += 1
-                    if alive_since_last_avg >= 20:
-                        if timeout_samples:
-                            avg = sum(timeout_samples) / len(timeout_samples)
-                            avg_timeout[0] = min(30, avg + timeout_buffer)
-                            logging.info(
-                                f"{min(i+batch_size, total)}/{total} checked, {dead_count} dead, average timeout: {avg:.2f}s"
-                            )
-                        else:
-                            logging.info(
-                                f"{min(i+batch_size, total)}/{total} checked, {dead_count} dead"
-                            )
-                        alive_since_last_avg = 0
-
-                next_batch = channels[i + batch_size : i + batch_size * 2]
-
-        print()
-        return results
+            statuses[index] = _STATUS_CODES.get(status, 0)
+            checked += 1
+            if status == STATUS_ALIVE:
+                alive_since_last_log += 1
+            elif status == STATUS_DEAD:
+                dead_count += 1
+            if alive_since_last_log >= 20:
+                logging.info(f"{checked}/{total} checked, {dead_count} dead")
+                alive_since_last_log = 0
+
+        # Results come back in playlist order, not completion order.
+        return [
+            CheckResult(ch.name, ch.url, _STATUS_NAMES[code], ch.entry)
+            for ch, code in zip(channels, statuses)
+        ]
     except Exception as e:
         logging.error(f"Error checking channels: {e}")
         return []
 
 
-def write_channels_to_m3u(
-    filename,
-    channels,
-    channel_map,
-    extinf_map,
-    extgrp_map,
-    status_filter=None,
-    mode="w",
-):
+def write_channels_to_m3u(filename, channels, status_filter=None, mode="w"):
     filepath = os.path.join(OUTPUT_DIR, filename)
-    with open(filepath, mode, encoding="utf-8") as f:
+    with open(filepath, mode + "b", buffering=1 << 20) as f:
         if mode == "w":
-            f.write("#EXTM3U\n")
-        for name, url, status in channels:
-            if status_filter and status != status_filter:
-                continue
-            ch = channel_map.get(url)
-            extinf = extinf_map.get(url)
-            extgrp = extgrp_map.get(url)
-            if extinf:
-                extinf_parts = extinf.split(",", 1)
-                if len(extinf_parts) > 1:
-                    f.write(f"{extinf_parts[0]},{name}\n")
-                else:
-                    f.write(f"{extinf},{name}\n")
-            else:
-                extinf_attrs = []
-                if hasattr(ch, "tvg_id") and ch.tvg_id:
-                    extinf_attrs.append(f'tvg-id="{ch.tvg_id}"')
-                if hasattr(ch, "tvg_name") and ch.tvg_name:
-                    extinf_attrs.append(f'tvg-name="{ch.tvg_name}"')
-                if hasattr(ch, "tvg_logo") and ch.tvg_logo:
-                    extinf_attrs.append(f'tvg-logo="{ch.tvg_logo}"')
-                group = (
-                    getattr(ch, "group_title", None) or getattr(ch, "group", None) or ""
-                )
-                if group:
-                    extinf_attrs.append(f'group-title="{group}"')
-                extinf_str = " ".join(extinf_attrs)
-                f.write(f"#EXTINF:-1 {extinf_str},{name}\n")
-            if extgrp:
-                f.write(f"#EXTGRP:{extgrp}\n")
-            f.write(f"{url}\n")
+            f.write(b"#EXTM3U\n")
+        f.writelines(
+            entry
+            for _, _, status, entry in channels
+            if not status_filter or status == status_filter
+        )
 
 
 def main():
@@ -277,25 +837,25 @@ def main():
     retry_delay = get_retry_delay()
     max_workers = get_max_workers()
     diagnostics_dir = "diagnostics"
-    pl = load_playlist(source)
-    if not pl:
+    need_codec_info = get_need_codec_info()
+    channels = load_playlist(source)
+    if channels is None:
         print("Failed to load playlist.")
         return
-    channels = pl.get_channels()
-    channel_map = {ch.url: ch for ch in channels}
-    extinf_map = {ch.url: getattr(ch, "original_extinf", None) for ch in channels}
-    extgrp_map = {ch.url: getattr(ch, "extgrp", None) for ch in channels}
-    results = check_channels(source, retry_delay, max_workers, diagnostics_dir)
-    for name, url, status in results:
+    results = check_channels(
+        channels, retry_delay, max_workers, diagnostics_dir, need_codec_info
+    )
+    for name, url, status, _ in results:
         logging.info(f"{name}: {status} ({url})")
-    alive_channels = [r for r in results if r[2] == "ALIVE"]
-    unstable_channels = [r for r in results if r[2] == "UNSTABLE"]
-    dead_channels = [r for r in results if r[2] == "DEAD"]
+    by_status = {STATUS_ALIVE: [], STATUS_UNSTABLE: [], STATUS_DEAD: []}
+    for result in results:
+        by_status.setdefault(result.status, []).append(result)
+    alive_channels = by_status[STATUS_ALIVE]
+    unstable_channels = by_status[STATUS_UNSTABLE]
+    dead_channels = by_status[STATUS_DEAD]
     playlist_channels = alive_channels + unstable_channels
     if playlist_channels:
-        write_channels_to_m3u(
-            "alive_channels.m3u", playlist_channels, channel_map, extinf_map, extgrp_map
-        )
+        write_channels_to_m3u("alive_channels.m3u", playlist_channels)
         print(
             f"Wrote {len(playlist_channels)} alive or unstable channels to {os.path.join(OUTPUT_DIR, 'alive_channels.m3u')}"
         )
@@ -303,9 +863,7 @@ def main():
         print("No alive or unstable channels found.")
 
     if dead_channels:
-        write_channels_to_m3u(
-            "dead_channels.m3u", dead_channels, channel_map, extinf_map, extgrp_map
-        )
+        write_channels_to_m3u("dead_channels.m3u", dead_channels)
         print(
             f"Wrote {len(dead_channels)} dead channels to {os.path.join(OUTPUT_DIR, 'dead_channels.m3u')}"
         )
@@ -325,35 +883,22 @@ def main():
         )
         if answer == "y":
             longer_timeout = 30
-            retest_results = []
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                future_to_channel = {
-                    executor.submit(
-                        get_channel_status,
-                        url,
-                        retry_delay,
-                        diagnostics_dir,
-                        longer_timeout,
-                    ): (name, url, status)
-                    for name, url, status in unstable_channels
-                }
-                for future in as_completed(future_to_channel):
-                    name, url, _ = future_to_channel[future]
-                    status2 = future.result()
-                    retest_results.append((name, url, status2))
+            # Same windowed, per-host capped pipeline as the first pass;
+            # CheckResult carries the name/url/entry check_channels needs.
+            retest_results = check_channels(
+                unstable_channels,
+                retry_delay,
+                max_workers,
+                diagnostics_dir,
+                need_codec_info,
+                timeout_override=longer_timeout,
+            )
             write_channels_to_m3u(
-                "unstable_channels.m3u",
-                [r for r in retest_results if r[2] == "ALIVE"],
-                channel_map,
-                extinf_map,
-                extgrp_map,
+                "unstable_channels.m3u", retest_results, status_filter=STATUS_ALIVE
             )
             write_channels_to_m3u(
                 "dead_channels.m3u",
-                [r for r in retest_results if r[2] != "ALIVE"],
-                channel_map,
-                extinf_map,
-                extgrp_map,
+                (r for r in retest_results if r.status is not STATUS_ALIVE),
                 mode="a",
             )
 
@@ -0,0 +1,38 @@
+"""HTTP session shared by every playlist download."""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = "VLC/3.0.11 LibVLC/3.0.11"
+PLAYLIST_TIMEOUT = 30
+PLAYLIST_RETRIES = 3
+# iter_lines defaults to 512-byte reads; 64 KiB chunks keep the per-chunk
+# overhead negligible on large playlists.
+PLAYLIST_CHUNK_BYTES = 1 << 16
+
+# The checker, filter and organizer all download through this session, so
+# the same provider is reached over one pooled keep-alive connection.
+# Playlists are fetched rarely, so transient server errors are retried.
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": USER_AGENT})
+_adapter = HTTPAdapter(
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=PLAYLIST_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+    ),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+
+def iter_playlist_lines(url):
+    """Stream the text lines of a remote playlist without buffering the body."""
+    with SESSION.get(url, stream=True, timeout=PLAYLIST_TIMEOUT) as resp:
+        resp.raise_for_status()
+        resp.encoding = resp.encoding or "utf-8"
+        yield from resp.iter_lines(
+            chunk_size=PLAYLIST_CHUNK_BYTES, decode_unicode=True
+        )
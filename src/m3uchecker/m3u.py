@@ -0,0 +1,121 @@
+"""Single-pass M3U playlist parser."""
+
+import operator
+import re
+
+_ATTR_RE = re.compile(r'([\w-]+)="([^"]*)"')
+# One match per entry: the #EXTINF line, any directive or blank lines that
+# follow it (but not another #EXTINF), and the stream URL. Leading blanks
+# are the ASCII characters str.strip() removes, minus the line breaks, so a
+# line iter_m3u() would see as empty is skipped here as well.
+_BLANK = rb"[ \t\x0b\x0c\x1c-\x1f]*"
+_ENTRY_RE = re.compile(
+    rb"^" + _BLANK + rb"(#EXTINF[^\r\n]*)\r?\n"
+    rb"((?:" + _BLANK + rb"(?:#(?!EXTINF)[^\r\n]*)?\r?\n)*?)"
+    + _BLANK + rb"([^#\s\x1c-\x1f][^\r\n]*)",
+    re.MULTILINE,
+)
+_EXTGRP_RE = re.compile(rb"^[ \t]*#EXTGRP:([^\r\n]*)", re.MULTILINE)
+# Channel attribute -> #EXTINF attribute, in the order they are written.
+_EXTINF_ATTRS = (
+    ("tvg_id", "tvg-id"),
+    ("tvg_name", "tvg-name"),
+    ("tvg_logo", "tvg-logo"),
+    ("group_title", "group-title"),
+)
+_get_extinf_values = operator.attrgetter(*(attr for attr, _ in _EXTINF_ATTRS))
+
+
+class Channel:
+    __slots__ = (
+        "name",
+        "url",
+        "tvg_id",
+        "tvg_name",
+        "tvg_logo",
+        "group_title",
+        "original_extinf",
+        "extgrp",
+        "entry",
+    )
+
+    def __init__(self, name, url, attributes, original_extinf=None, extgrp=None):
+        self.name = name
+        self.url = url
+        self.tvg_id = attributes.get("tvg-id")
+        self.tvg_name = attributes.get("tvg-name")
+        self.tvg_logo = attributes.get("tvg-logo")
+        self.group_title = attributes.get("group-title")
+        self.original_extinf = original_extinf
+        self.extgrp = extgrp
+        self.entry = build_entry(self)
+
+
+def build_entry(ch):
+    """Serialise a channel as the UTF-8 #EXTINF/#EXTGRP/URL lines written to output."""
+    if ch.original_extinf:
+        extinf = ch.original_extinf
+    else:
+        extinf_attrs = " ".join(
+            f'{key}="{value}"'
+            for (_, key), value in zip(_EXTINF_ATTRS, _get_extinf_values(ch))
+            if value
+        )
+        extinf = f"#EXTINF:-1 {extinf_attrs},{ch.name}"
+    if ch.extgrp:
+        return f"{extinf}\n#EXTGRP:{ch.extgrp}\n{ch.url}\n".encode("utf-8")
+    return f"{extinf}\n{ch.url}\n".encode("utf-8")
+
+
+def parse_extinf(line):
+    """Return the attribute dict and display name of an #EXTINF line."""
+    attributes = dict(_ATTR_RE.findall(line))
+    parts = _ATTR_RE.sub("", line).split(",", 1)
+    name = parts[1].strip() if len(parts) > 1 else ""
+    return attributes, name
+
+
+def iter_m3u(lines):
+    """Yield a Channel for every #EXTINF entry while walking the lines once.
+
+    `lines` can be any iterable of text lines (an open file, a streamed HTTP
+    response), so the playlist is never materialised as a single string.
+    """
+    extinf = None
+    extgrp = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF"):
+            extinf = line
+            extgrp = None
+        elif line.startswith("#EXTGRP:"):
+            extgrp = line[len("#EXTGRP:") :].strip() or None
+        elif line.startswith("#"):
+            continue
+        elif extinf:
+            attributes, name = parse_extinf(extinf)
+            yield Channel(name, line, attributes, extinf, extgrp)
+            extinf = None
+            extgrp = None
+
+
+def iter_m3u_bytes(data):
+    """Same as iter_m3u, for a whole playlist held in a bytes-like buffer.
+
+    Entries are located by a single compiled regex scan, so the per-line
+    work happens inside the regex engine rather than in a Python loop. The
+    buffer can be an mmap, so file sources are never copied into memory.
+    """
+    for match in _ENTRY_RE.finditer(data):
+        extinf, directives, url = match.groups()
+        url = url.decode("utf-8", "replace").strip()
+        extgrp = None
+        if directives:
+            groups = _EXTGRP_RE.findall(directives)
+            if groups:
+                extgrp = groups[-1].decode("utf-8", "replace").strip() or None
+        extinf = extinf.decode("utf-8", "replace").strip()
+        attributes, name = parse_extinf(extinf)
+        yield Channel(name, url, attributes, extinf, extgrp)
@@ -4,12 +4,16 @@ import sys
 import json
 import time
 import re
+import threading
 from urllib.parse import urlparse
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
 
-import requests
-from ipytv import playlist
+from m3uchecker.http import iter_playlist_lines
+from m3uchecker.m3u import iter_m3u
 
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 
@@ -33,6 +37,20 @@ OUTPUT_DIR = PROJECT_ROOT / "output"
 OUTPUT_DIR.mkdir(exist_ok=True)
 
 CHUNK_SIZE = 300
+# Chunks sent to Gemini at once. Concurrency alone doesn't bound the request
+# rate, so every call (retries included) also waits for a shared slot.
+GEMINI_CONCURRENCY = 4
+# Free-tier quota of gemini-2.0-flash; raise it in config.py on paid plans.
+GEMINI_REQUESTS_PER_MINUTE = (
+    int(getattr(config, "GEMINI_REQUESTS_PER_MINUTE", 15) or 15) if config else 15
+)
+
+_gemini_rate_lock = threading.Lock()
+_gemini_next_request = 0.0
+
+# Outermost [...] in a model response, and a surrounding ```json fence.
+_JSON_ARRAY_RE = re.compile(r"\[.*\]", re.S)
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
 
 
 def get_gemini_api_key():
@@ -60,31 +78,9 @@ def get_playlist_source():
 def load_playlist(source):
     try:
         if urlparse(source).scheme in ("http", "https"):
-            resp = requests.get(source)
-            resp.raise_for_status()
-            playlist_content = resp.text
-            pl = playlist.loads(playlist_content)
-            original_lines = playlist_content.splitlines()
-        else:
-            with open(source, "r", encoding="utf-8") as f:
-                playlist_content = f.read()
-            pl = playlist.loadf(source)
-            original_lines = playlist_content.splitlines()
-
-        url_to_extinf = {}
-        current_extinf = None
-        for line in original_lines:
-            if line.startswith("#EXTINF"):
-                current_extinf = line
-            elif line and not line.startswith("#") and current_extinf:
-                url_to_extinf[line] = current_extinf
-                current_extinf = None
-
-        for ch in pl.get_channels():
-            ch.original_extinf = url_to_extinf.get(ch.url, None)
-            ch.extgrp = getattr(ch, "extgrp", None)
-
-        return pl
+            return list(iter_m3u(iter_playlist_lines(source)))
+        with open(source, "r", encoding="utf-8") as f:
+            return list(iter_m3u(f))
     except FileNotFoundError:
         print(f"Error: File not found: {source}")
     except Exception as e:
@@ -95,7 +91,7 @@ def load_playlist(source):
 def extract_channel_info(channels):
     channel_list = []
     for idx, ch in enumerate(channels):
-        group = getattr(ch, "group_title", None) or getattr(ch, "group", None) or ""
+        group = ch.group_title or ""
         channel_list.append(
             {
                 "id": idx,
@@ -106,16 +102,24 @@ def extract_channel_info(channels):
     return channel_list
 
 
-def build_gemini_prompt(channel_chunk, existing_groups=None):
-    existing_groups_text = ""
-    if existing_groups:
-        existing_groups_text = f"""
+@lru_cache(maxsize=8)
+def _existing_groups_text(existing_groups):
+    # Every chunk after the first gets the same groups; serialise them once.
+    if not existing_groups:
+        return ""
+    return f"""
 IMPORTANT: Use these existing group names when appropriate to maintain consistency:
-{json.dumps(existing_groups, indent=2)}
+{json.dumps(existing_groups, separators=(",", ":"))}
 
 Only create new groups if the channel truly doesn't fit any existing category.
 """
 
+
+def build_gemini_prompt(channel_chunk, existing_groups=None):
+    existing_groups_text = _existing_groups_text(
+        tuple(existing_groups) if existing_groups else None
+    )
+
     prompt = f"""You are an expert at organizing IPTV channel playlists. Analyze these channels and:
 1. Suggest a proper, standardized channel name (clean up messy names, fix capitalization, remove quality tags like HD/FHD/4K from the name unless it's part of the official channel name)
 2. Assign an appropriate group/category
@@ -134,7 +138,7 @@ Guidelines for groups:
 IMPORTANT: Keep the same channel with different sources - just standardize the name.
 
 Here are the channels to organize:
-{json.dumps(channel_chunk, indent=2)}
+{json.dumps(channel_chunk, separators=(",", ":"))}
 
 Respond with ONLY a valid JSON array in this exact format, no other text:
 [
@@ -145,14 +149,49 @@ Respond with ONLY a valid JSON array in this exact format, no other text:
     return prompt
 
 
-def call_gemini_api(api_key, prompt, retries=3):
+def parse_json_array(text):
+    """Decode the JSON array in a model response, or return None.
+
+    The usual reply is bare or fenced JSON, which decodes directly; the
+    regex search is only a fallback for replies with extra prose.
+    """
+    for candidate in (text, _CODE_FENCE_RE.sub("", text)):
+        try:
+            result = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(result, list):
+            return result
+    json_match = _JSON_ARRAY_RE.search(text)
+    if json_match:
+        return json.loads(json_match.group())
+    return None
+
+
+def _wait_for_gemini_slot():
+    """Space requests at least 60 / GEMINI_REQUESTS_PER_MINUTE seconds apart."""
+    global _gemini_next_request
+    interval = 60 / GEMINI_REQUESTS_PER_MINUTE
+    with _gemini_rate_lock:
+        now = time.monotonic()
+        slot = max(now, _gemini_next_request)
+        _gemini_next_request = slot + interval
+    # Sleep outside the lock; each caller already owns its own slot.
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def create_gemini_model(api_key):
     if not genai:
         raise ImportError("google-generativeai package not installed")
 
     genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-2.0-flash")
+    return genai.GenerativeModel("gemini-2.0-flash")
+
 
+def call_gemini_api(model, prompt, retries=3):
     for attempt in range(retries):
+        _wait_for_gemini_slot()
         try:
             response = model.generate_content(
                 prompt,
@@ -164,9 +203,9 @@ def call_gemini_api(api_key, prompt, retries=3):
 
             response_text = response.text.strip()
 
-            json_match = re.search(r"\[[\s\S]*\]", response_text)
-            if json_match:
-                return json.loads(json_match.group())
+            result = parse_json_array(response_text)
+            if result is not None:
+                return result
             else:
                 print(
                     f"Warning: Could not find JSON in response, attempt {attempt + 1}"
@@ -197,17 +236,9 @@ def process_channels_with_gemini(channels, existing_groups=None):
         reorganization_map = {}
         existing_groups = set()
 
-        for i in range(0, total, CHUNK_SIZE):
+        def apply_result(i, result):
             chunk = channel_info[i : i + CHUNK_SIZE]
             chunk_end = min(i + CHUNK_SIZE, total)
-            print(f"  Processing channels {i + 1} to {chunk_end} of {total}...")
-
-            prompt = build_gemini_prompt(
-                chunk, list(existing_groups) if existing_groups else None
-            )
-
-            result = call_gemini_api(api_key, prompt)
-
             if result:
                 for item in result:
                     channel_id = item.get("id")
@@ -230,9 +261,29 @@ def process_channels_with_gemini(channels, existing_groups=None):
                         "new_group": ch_info["current_group"],
                     }
 
-            # Rate limiting - be nice to the API
-            if i + CHUNK_SIZE < total:
-                time.sleep(1)
+        def process_chunk(i, groups):
+            chunk = channel_info[i : i + CHUNK_SIZE]
+            chunk_end = min(i + CHUNK_SIZE, total)
+            print(f"  Processing channels {i + 1} to {chunk_end} of {total}...")
+            return call_gemini_api(model, build_gemini_prompt(chunk, groups))
+
+        starts = list(range(0, total, CHUNK_SIZE))
+        if not starts:
+            return reorganization_map, existing_groups
+
+        # Configured once here, not from every worker thread.
+        model = create_gemini_model(api_key)
+
+        # The first chunk runs alone so the groups it creates are offered to
+        # every other chunk, which then run concurrently.
+        apply_result(starts[0], process_chunk(starts[0], None))
+        groups = list(existing_groups) or None
+        with ThreadPoolExecutor(max_workers=GEMINI_CONCURRENCY) as executor:
+            futures = {
+                executor.submit(process_chunk, i, groups): i for i in starts[1:]
+            }
+            for future in as_completed(futures):
+                apply_result(futures[future], future.result())
 
         print(f"\nIdentified {len(existing_groups)} unique groups/categories")
         return reorganization_map, existing_groups
@@ -250,7 +301,7 @@ def build_extinf_line(channel, new_name, new_group):
     duration = "-1"
 
     # tvg-id
-    tvg_id = getattr(channel, "tvg_id", None) or ""
+    tvg_id = channel.tvg_id or ""
     if tvg_id:
         attrs.append(f'tvg-id="{tvg_id}"')
 
@@ -258,7 +309,7 @@ def build_extinf_line(channel, new_name, new_group):
     attrs.append(f'tvg-name="{new_name}"')
 
     # tvg-logo
-    tvg_logo = getattr(channel, "tvg_logo", None) or ""
+    tvg_logo = channel.tvg_logo or ""
     if tvg_logo:
         attrs.append(f'tvg-logo="{tvg_logo}"')
 
@@ -273,44 +324,45 @@ def write_organized_m3u(filename, channels, reorganization_map):
     """Write organized channels to M3U file, sorted by group then name."""
     filepath = os.path.join(OUTPUT_DIR, filename)
 
-    # Build list of (group, name, channel, extinf_line) tuples
+    # Build list of (group_key, name_key, group, name, channel, extinf_line)
+    # tuples; the lowercase sort keys are computed once per channel.
     organized = []
     for idx, ch in enumerate(channels):
         mapping = reorganization_map.get(idx, {})
         new_name = mapping.get("new_name") or ch.name or "Unknown"
         new_group = (
             mapping.get("new_group")
-            or getattr(ch, "group_title", "")
+            or ch.group_title
             or "Uncategorized"
         )
 
         extinf_line = build_extinf_line(ch, new_name, new_group)
-        organized.append((new_group, new_name, ch, extinf_line))
+        organized.append(
+            (new_group.lower(), new_name.lower(), new_group, new_name, ch, extinf_line)
+        )
 
     # Sort by group, then by name
-    organized.sort(key=lambda x: (x[0].lower(), x[1].lower()))
-
-    # Write to file
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write("#EXTM3U\n")
-
-        current_group = None
-        for group, name, ch, extinf_line in organized:
-            # Add group comment for readability (optional visual separator)
-            if group != current_group:
-                if current_group is not None:
-                    f.write("\n")  # Blank line between groups
-                f.write(f"# ===== {group} =====\n")
-                current_group = group
-
-            f.write(f"{extinf_line}\n")
-
-            # Write EXTGRP if present
-            extgrp = getattr(ch, "extgrp", None)
-            if extgrp:
-                f.write(f"#EXTGRP:{new_group}\n")
+    organized.sort(key=itemgetter(0, 1))
+
+    # Build every line block first, then hand them to the writer at once
+    parts = ["#EXTM3U\n"]
+    current_group = None
+    for _, _, group, name, ch, extinf_line in organized:
+        # Add group comment for readability (optional visual separator)
+        if group != current_group:
+            if current_group is not None:
+                parts.append("\n")  # Blank line between groups
+            parts.append(f"# ===== {group} =====\n")
+            current_group = group
+
+        # Write EXTGRP if present
+        if ch.extgrp:
+            parts.append(f"{extinf_line}\n#EXTGRP:{group}\n{ch.url}\n")
+        else:
+            parts.append(f"{extinf_line}\n{ch.url}\n")
 
-            f.write(f"{ch.url}\n")
+    with open(filepath, "w", encoding="utf-8", buffering=1 << 20) as f:
+        f.writelines(parts)
 
     return filepath
 
@@ -344,12 +396,11 @@ def main():
         return
 
     print(f"Loading playlist from: {source}")
-    pl = load_playlist(source)
-    if not pl:
+    channels = load_playlist(source)
+    if channels is None:
         print("Failed to load playlist. Exiting.")
         return
 
-    channels = pl.get_channels()
     print(f"Loaded {len(channels)} channels.\n")
 
     if len(channels) == 0:
@@ -1,15 +1,43 @@
+import argparse
 import logging
+import math
 import os
+import statistics
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
 
-from m3uchecker.health_check import check_channels
+# m3uchecker.health_check (and with it requests) is imported inside the
+# functions that use it, so `--help` and argument errors return at once.
 
+# Probes are network-bound, so the best concurrency tracks latency rather
+# than core count; sweep geometrically up to where the plateau usually is.
 BENCHMARK_WORKERS = [
     int(x.strip())
-    for x in os.getenv("BENCHMARK_WORKERS", "4,8,10,12,16,20,40,60").split(",")
+    for x in os.getenv("BENCHMARK_WORKERS", "16,32,64,128,256,512").split(",")
     if x.strip().isdigit()
 ]
+BENCHMARK_MAX_WORKERS = 512
+# A run slower than this multiple of the best median so far is abandoned.
+BENCHMARK_ABORT_FACTOR = 1.5
+# Medians within this fraction of the fastest count as equally fast; the
+# smallest such worker count is recommended.
+BENCHMARK_KNEE_TOLERANCE = 0.05
+BENCHMARK_RESULTS_FILE = "benchmark.json"
+# Stop sweeping once this many larger worker counts in a row were slower.
+BENCHMARK_PATIENCE = 2
+# Timed runs per sweep point, after one discarded warm-up run.
+BENCHMARK_TRIALS = max(1, int(os.getenv("BENCHMARK_TRIALS", "3")))
+# Per-probe timeout (connect, read and ffprobe) while benchmarking, so a
+# dead stream costs a bounded amount of time instead of full retries.
+BENCHMARK_PROBE_TIMEOUT = float(os.getenv("BENCHMARK_PROBE_TIMEOUT", "3"))
+# Channels probed per sweep point; 0 benchmarks the whole playlist.
+BENCHMARK_SAMPLE_SIZE = int(os.getenv("BENCHMARK_SAMPLE_SIZE", "100"))
+# Pin the sweep to this many CPUs (0 disables pinning), to measure under the
+# core count production gets and keep threads from migrating mid-run.
+BENCHMARK_CPUS = int(os.getenv("BENCHMARK_CPUS", "0"))
 BENCHMARK_CACHE_SECONDS = int(os.getenv("BENCHMARK_CACHE_SECONDS", "3600"))
 
 _benchmark_lock = threading.Lock()
@@ -21,7 +49,176 @@ def get_last_best_workers(default):
     return _last_best_workers if _last_best_workers is not None else default
 
 
-def get_fastest_workers(source, retry_delay, max_workers, diagnostics_dir):
+def get_worker_values(channels, max_workers, worker_values=None):
+    """Return the ascending worker counts to sweep for `channels`.
+
+    More workers than channels only adds idle threads, so every value is
+    capped at min(len(channels), BENCHMARK_MAX_WORKERS).
+    """
+    cap = max(1, min(len(channels), BENCHMARK_MAX_WORKERS))
+    values = list(worker_values or BENCHMARK_WORKERS) + [max_workers]
+    return sorted({min(int(w), cap) for w in values if int(w) > 0})
+
+
+def sample_by_host(channels, sample_size):
+    """Pick up to `sample_size` channels spread round-robin across hosts.
+
+    A playlist's first entries often all come from one CDN, which would
+    make the sweep measure that origin's rate limit instead of the pool.
+    Returns the sample and the number of distinct hosts in it.
+    """
+    buckets = {}
+    for ch in channels:
+        try:
+            host = urlsplit(ch.url).netloc.lower()
+        except ValueError:
+            host = ""
+        buckets.setdefault(host, []).append(ch)
+    if sample_size <= 0 or sample_size >= len(channels):
+        return list(channels), len(buckets)
+
+    per_host = math.ceil(sample_size / len(buckets))
+    sample = []
+    for round_index in range(per_host):
+        for bucket in buckets.values():
+            if round_index < len(bucket) and len(sample) < sample_size:
+                sample.append(bucket[round_index])
+    return sample, min(len(buckets), sample_size)
+
+
+def _warm_connections(channels, executor):
+    """Open one pooled keep-alive connection per host before timing starts.
+
+    Otherwise the first sweep point pays every DNS lookup and TCP/TLS
+    handshake and looks slower than the points after it.
+    """
+    import requests
+
+    from m3uchecker.health_check import PROBE_CONNECT_TIMEOUT, PROBE_TIMEOUT, SESSION
+
+    urls = {}
+    for ch in channels:
+        try:
+            urls.setdefault(urlsplit(ch.url)[:2], ch.url)
+        except ValueError:
+            continue
+
+    def warm(url):
+        try:
+            SESSION.head(
+                url,
+                timeout=(PROBE_CONNECT_TIMEOUT, PROBE_TIMEOUT),
+                allow_redirects=False,
+            ).close()
+        except (requests.RequestException, ValueError):
+            pass
+
+    list(executor.map(warm, urls.values()))
+
+
+@contextmanager
+def _pinned_cpus(count):
+    """Restrict the calling thread, and threads it starts, to `count` CPUs."""
+    if count <= 0 or not hasattr(os, "sched_setaffinity"):
+        yield
+        return
+    original = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, sorted(original)[:count])
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, original)
+
+
+def pick_knee(results):
+    """Return the smallest worker count about as fast as the fastest one.
+
+    Past the knee of the curve extra threads buy little or nothing, so the
+    cheapest configuration on the plateau beats a marginal argmin.
+    """
+    finished = [r for r in results if not r["aborted"]]
+    if not finished:
+        return None
+    # An overloaded pool can look fast because its probes time out early;
+    # only compare points that lost no more channels than the best one.
+    fewest = min(r["timeout_rate"] for r in finished)
+    finished = [
+        r
+        for r in finished
+        if r["timeout_rate"] <= fewest + BENCHMARK_KNEE_TOLERANCE
+    ]
+    fastest = min(r["median_s"] for r in finished)
+    return min(
+        r["workers"]
+        for r in finished
+        if r["median_s"] <= fastest * (1 + BENCHMARK_KNEE_TOLERANCE)
+    )
+
+
+def _save_results(report):
+    from m3uchecker.health_check import OUTPUT_DIR, dump_json
+
+    try:
+        (OUTPUT_DIR / BENCHMARK_RESULTS_FILE).write_bytes(dump_json(report))
+    except OSError as e:
+        logging.error(f"Could not write benchmark results: {e}")
+
+
+def _timed_run(channels, workers, diagnostics_dir, executor, limit_ns=None):
+    """Check `channels` once; return the elapsed nanoseconds and timeouts.
+
+    Returns None as soon as the run exceeds `limit_ns`; the probes still in
+    flight are cancelled or waited out before returning. Nothing is logged
+    while the clock runs.
+    """
+    from m3uchecker.health_check import STATUS_UNSTABLE, iter_channel_statuses
+
+    start = time.perf_counter_ns()
+    # Cache hits would make every run after the first look instant.
+    # A retry delay of 0 turns off the back-off sleeps between ffprobe
+    # attempts: the sweep measures the pool, not the retry policy.
+    statuses = iter_channel_statuses(
+        channels,
+        0,
+        workers,
+        diagnostics_dir,
+        use_cache=False,
+        timeout_override=BENCHMARK_PROBE_TIMEOUT,
+        executor=executor,
+    )
+    timeouts = 0
+    try:
+        for _, status in statuses:
+            if status is STATUS_UNSTABLE:
+                timeouts += 1
+            if limit_ns is not None and time.perf_counter_ns() - start > limit_ns:
+                return None
+        return time.perf_counter_ns() - start, timeouts
+    finally:
+        statuses.close()
+
+
+def get_fastest_workers(
+    channels,
+    retry_delay,
+    max_workers,
+    diagnostics_dir,
+    worker_values=None,
+    sample_size=None,
+    trials=None,
+    cpus=None,
+):
+    """Benchmark worker counts on a sample of `channels`; return the best.
+
+    Probes run without retry back-off and with BENCHMARK_PROBE_TIMEOUT, so
+    `retry_delay` only applies to the real check the result is used for.
+    `sample_size`, `trials` and `cpus` default to the BENCHMARK_* settings.
+    """
+    if sample_size is None:
+        sample_size = BENCHMARK_SAMPLE_SIZE
+    trials = max(1, trials or BENCHMARK_TRIALS)
+    if cpus is None:
+        cpus = BENCHMARK_CPUS
     global _last_benchmark_ts, _last_best_workers
 
     now = time.time()
@@ -39,23 +236,172 @@ def get_fastest_workers(source, retry_delay, max_workers, diagnostics_dir):
         ):
             return _last_best_workers
 
-        worker_values = sorted(set(BENCHMARK_WORKERS + [max_workers]))
-        best_workers = max_workers
+        if not channels:
+            return max_workers
+        from m3uchecker.health_check import _prefetch_hosts
+
         best_time = float("inf")
+        results = []
+        previous_time = None
+        slower = 0
 
-        for workers in worker_values:
-            try:
-                start = time.perf_counter()
-                check_channels(source, retry_delay, workers, diagnostics_dir)
-                elapsed = time.perf_counter() - start
-                logging.info(f"Benchmark workers={workers} took {elapsed:.2f}s")
-                if elapsed < best_time:
-                    best_time = elapsed
-                    best_workers = workers
-            except Exception:
-                logging.exception(f"Benchmark failed for workers={workers}")
+        channels, hosts = sample_by_host(channels, sample_size)
+        values = get_worker_values(channels, max_workers, worker_values)
+        if not values:
+            return max_workers
+        # One pool for the whole sweep, so thread start-up isn't timed as
+        # part of whichever point happens to need the new threads.
+        # Pool threads inherit the pinned affinity from this thread.
+        with _pinned_cpus(cpus), ThreadPoolExecutor(
+            max_workers=values[-1]
+        ) as executor:
+            # Resolve every host up front; the runs then hit the DNS cache.
+            _prefetch_hosts(channels)
+            _warm_connections(channels, executor)
+            for workers in values:
+                limit_ns = None
+                if best_time != float("inf"):
+                    limit_ns = int(best_time * BENCHMARK_ABORT_FACTOR * 1e9)
+                run = (channels, workers, diagnostics_dir, executor)
+                samples = []
+                timeouts = []
+                try:
+                    # Warm-up, discarded: lets the pool grow to `workers` threads.
+                    if _timed_run(*run, limit_ns) is not None:
+                        for _ in range(trials):
+                            sample = _timed_run(*run, limit_ns)
+                            if sample is None:
+                                break
+                            samples.append(sample[0])
+                            timeouts.append(sample[1])
+                except Exception:
+                    logging.exception(f"Benchmark failed for workers={workers}")
+                    continue
+                aborted = len(samples) < trials
+                if aborted:
+                    # Clearly slower than the best: record it at the cutoff so
+                    # it still counts towards stopping the sweep.
+                    samples = [limit_ns]
+                # Median and median absolute deviation: one stalled run
+                # shouldn't decide the winner.
+                elapsed = statistics.median(samples) / 1e9
+                mad = statistics.median(abs(x / 1e9 - elapsed) for x in samples)
+                if aborted:
+                    timeout_rate = None
+                    detail = "abandoned"
+                else:
+                    timeout_rate = round(statistics.median(timeouts) / len(channels), 3)
+                    detail = f"{len(samples)} trials, {timeout_rate:.0%} timed out"
+                logging.info(
+                    f"Benchmark workers={workers} took {elapsed:.2f}s ± {mad:.2f}s"
+                    f" ({len(channels)} channels, {hosts} hosts, {detail})"
+                )
+                results.append(
+                    {
+                        "workers": workers,
+                        "median_s": round(elapsed, 3),
+                        "mad_s": round(mad, 3),
+                        "throughput": round(len(channels) / elapsed, 2)
+                        if elapsed
+                        else None,
+                        "timeout_rate": timeout_rate,
+                        "trials": 0 if aborted else len(samples),
+                        "aborted": aborted,
+                    }
+                )
+                best_time = min(best_time, elapsed)
+                # Past the knee, extra threads only add contention; don't keep
+                # paying for ever larger sweeps.
+                if previous_time is not None and elapsed > previous_time:
+                    slower += 1
+                else:
+                    slower = 0
+                previous_time = elapsed
+                if slower >= BENCHMARK_PATIENCE:
+                    logging.info(
+                        f"Benchmark stopped at workers={workers}: past the knee"
+                    )
+                    break
 
+        best_workers = pick_knee(results) or max_workers
+        _save_results(
+            {
+                "channels": len(channels),
+                "hosts": hosts,
+                "recommended_workers": best_workers,
+                "results": results,
+            }
+        )
         _last_best_workers = best_workers
         _last_benchmark_ts = time.time()
-        logging.info(f"Selected fastest workers={best_workers}")
+        logging.info(f"Selected workers={best_workers}")
         return best_workers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Find the fastest number of parallel checks for a playlist."
+    )
+    parser.add_argument("source", nargs="?", help="M3U URL or file path")
+    parser.add_argument(
+        "--workers",
+        help="comma-separated worker counts to sweep (default: %(default)s)",
+        default=",".join(map(str, BENCHMARK_WORKERS)),
+    )
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        default=BENCHMARK_SAMPLE_SIZE,
+        help="channels probed per run, 0 for all (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--trials",
+        type=int,
+        default=BENCHMARK_TRIALS,
+        help="timed runs per worker count (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cpus",
+        type=int,
+        default=BENCHMARK_CPUS,
+        help="pin the run to this many CPUs, 0 to not pin (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+    try:
+        worker_values = [int(w) for w in args.workers.split(",") if w.strip()]
+    except ValueError:
+        worker_values = None
+    if not worker_values or min(worker_values) <= 0:
+        parser.error("--workers must be a comma-separated list of positive integers")
+    if args.trials < 1:
+        parser.error("--trials must be at least 1")
+    if args.sample_size < 0:
+        parser.error("--sample-size must be 0 or more")
+
+    from m3uchecker.health_check import get_playlist_source, load_playlist
+
+    source = args.source or get_playlist_source()
+    if not source:
+        print("Invalid playlist source.")
+        return
+    channels = load_playlist(source)
+    if channels is None:
+        print("Failed to load playlist.")
+        return
+    # The retry delay is unused while benchmarking; max_workers is only the
+    # fallback when every run fails.
+    workers = get_fastest_workers(
+        channels,
+        0,
+        worker_values[0],
+        None,
+        worker_values,
+        sample_size=args.sample_size,
+        trials=args.trials,
+        cpus=args.cpus,
+    )
+    print(f"Recommended workers: {workers}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_original_getaddrinfo = socket.getaddrinfo
+_cache = {}
+_cache_lock = threading.Lock()
+# Seconds a lookup is reused; long enough to cover a run, short enough that
+# a long-lived process (the API server) follows DNS changes.
+TTL = 300
+# Failed lookups are remembered briefly: dead hosts are retried a lot, but a
+# name that failed once must not stay unresolvable for the full TTL.
+NEGATIVE_TTL = 30
+# Resolver hiccups that say nothing about the name; never cached.
+_TEMPORARY_ERRORS = {
+    code
+    for code in (
+        getattr(socket, "EAI_AGAIN", None),
+        getattr(socket, "EAI_FAIL", None),
+        getattr(socket, "EAI_SYSTEM", None),
+    )
+    if code is not None
+}
+MAX_ENTRIES = 4096
+_install_lock = threading.Lock()
+_installed = False
+
+
+def _store(key, expiry, value):
+    with _cache_lock:
+        if len(_cache) >= MAX_ENTRIES:
+            now = time.monotonic()
+            for stale in [k for k, (exp, _) in _cache.items() if exp <= now]:
+                del _cache[stale]
+            # Still full of live entries: drop the oldest ones.
+            while len(_cache) >= MAX_ENTRIES:
+                del _cache[next(iter(_cache))]
+        _cache[key] = (expiry, value)
+
+
+def _cached_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    key = (host, port, family, type, proto, flags)
+    now = time.monotonic()
+    entry = _cache.get(key)
+    if entry is not None and entry[0] > now:
+        cached = entry[1]
+        # getaddrinfo returns a list; a tuple holds the args of a failure.
+        # Re-raising one stored exception would grow its traceback (and pin
+        # the frames in it) on every hit, so each hit gets a fresh one.
+        if isinstance(cached, tuple):
+            raise socket.gaierror(*cached)
+        return cached
+    try:
+        result = _original_getaddrinfo(host, port, family, type, proto, flags)
+    except socket.gaierror as e:
+        if e.errno not in _TEMPORARY_ERRORS:
+            _store(key, now + NEGATIVE_TTL, tuple(e.args))
+        raise
+    _store(key, now + TTL, result)
+    return result
+
+
+def install():
+    """Route socket.getaddrinfo through the process-wide cache."""
+    global _installed
+    with _install_lock:
+        if not _installed:
+            socket.getaddrinfo = _cached_getaddrinfo
+            _installed = True
+
+
+def prefetch(host_ports, max_workers=64):
+    """Resolve (host, port) pairs in parallel so probes start with a warm cache."""
+    install()
+    # Skip names still cached, so a warm cache costs no thread start-up.
+    now = time.monotonic()
+    host_ports = [
+        (host, port)
+        for host, port in host_ports
+        if _cache.get((host, port, 0, socket.SOCK_STREAM, 0, 0), (0,))[0] <= now
+    ]
+    if not host_ports:
+        return
+
+    def resolve(host_port):
+        host, port = host_port
+        try:
+            _cached_getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except OSError as e:
+            logging.debug(f"DNS prefetch failed for {host}: {e}")
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(host_ports))) as executor:
+        list(executor.map(resolve, host_ports))
@@ -0,0 +1,94 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+# Rows written per transaction; one commit per probe would fsync per channel.
+BATCH_SIZE = 200
+
+_conn = None
+_lock = threading.Lock()
+_fresh = {}
+_pending = []
+
+
+def open_cache(path):
+    """Open (or create) the SQLite probe cache at `path`."""
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = sqlite3.connect(str(path), check_same_thread=False)
+            _conn.execute(
+                "CREATE TABLE IF NOT EXISTS probe_cache ("
+                "url TEXT PRIMARY KEY, status TEXT, diagnostics TEXT, ts REAL)"
+            )
+            _conn.commit()
+    return _conn
+
+
+def prefetch(ttl):
+    """Load every entry younger than `ttl` seconds in one query.
+
+    check_cache then answers from memory instead of querying per channel.
+    """
+    global _fresh
+    if _conn is None or ttl <= 0:
+        return
+    try:
+        with _lock:
+            rows = _conn.execute(
+                "SELECT url, status, diagnostics, ts FROM probe_cache WHERE ts > ?",
+                (time.time() - ttl,),
+            ).fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Error reading probe cache: {e}")
+        return
+    _fresh = {url: (status, diagnostics, ts) for url, status, diagnostics, ts in rows}
+
+
+def check_cache(url, ttl):
+    """Return (status, diagnostics) stored for `url` less than `ttl` seconds ago."""
+    if ttl <= 0:
+        return None, None
+    row = _fresh.get(url)
+    if row is None or time.time() - row[2] >= ttl:
+        return None, None
+    status, diagnostics, _ = row
+    return status, json.loads(diagnostics) if diagnostics else None
+
+
+def _flush_locked():
+    if not _pending:
+        return
+    try:
+        with _conn:
+            _conn.executemany(
+                "INSERT OR REPLACE INTO probe_cache VALUES (?, ?, ?, ?)", _pending
+            )
+    except sqlite3.Error as e:
+        logging.error(f"Error writing probe cache: {e}")
+    _pending.clear()
+
+
+def store_result(url, status, diagnostics):
+    if _conn is None:
+        return
+    row = (
+        url,
+        status,
+        json.dumps(diagnostics) if diagnostics is not None else None,
+        time.time(),
+    )
+    with _lock:
+        _pending.append(row)
+        if len(_pending) >= BATCH_SIZE:
+            _flush_locked()
+
+
+def flush():
+    """Write out results buffered by store_result."""
+    if _conn is None:
+        return
+    with _lock:
+        _flush_locked()
@@ -0,0 +1,51 @@
+import pytest
+
+from m3uchecker.utils.benchmark_workers import pick_knee
+
+
+def point(workers, median_s, timeout_rate=0.0, aborted=False):
+    return {
+        "workers": workers,
+        "median_s": median_s,
+        "mad_s": 0.0,
+        "throughput": 100 / median_s,
+        "timeout_rate": timeout_rate,
+        "trials": 3,
+        "aborted": aborted,
+    }
+
+
+@pytest.mark.parametrize(
+    "results, expected",
+    [
+        pytest.param(
+            [point(16, 10.0), point(32, 10.2), point(64, 9.9), point(128, 10.1)],
+            16,
+            id="flat-curve-picks-smallest",
+        ),
+        pytest.param(
+            [point(16, 20.0), point(32, 10.4), point(64, 10.0), point(128, 14.0)],
+            32,
+            id="knee-within-tolerance",
+        ),
+        pytest.param(
+            [
+                point(16, 20.0),
+                point(32, 12.0, timeout_rate=0.01),
+                point(64, 8.0, timeout_rate=0.30),
+            ],
+            32,
+            id="timeouts-disqualify-fastest",
+        ),
+        pytest.param([point(64, 12.0)], 64, id="single-point"),
+        pytest.param(
+            [point(16, 10.0), point(32, 30.0, aborted=True)],
+            16,
+            id="aborted-points-ignored",
+        ),
+        pytest.param([point(16, 10.0, aborted=True)], None, id="all-aborted"),
+        pytest.param([], None, id="empty-sweep"),
+    ],
+)
+def test_pick_knee(results, expected):
+    assert pick_knee(results) == expected
@@ -0,0 +1,55 @@
+import socket
+
+import pytest
+
+from m3uchecker.utils import dns_cache
+
+
+@pytest.fixture
+def resolver(monkeypatch):
+    """Count lookups that reach the real resolver, which always fails."""
+    calls = []
+
+    def fail(host, *args):
+        calls.append(host)
+        raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+
+    monkeypatch.setattr(dns_cache, "_cache", {})
+    monkeypatch.setattr(dns_cache, "_original_getaddrinfo", fail)
+    return calls
+
+
+def lookup_error(host):
+    with pytest.raises(socket.gaierror) as excinfo:
+        dns_cache._cached_getaddrinfo(host, 80)
+    return excinfo.value
+
+
+def traceback_depth(error):
+    depth, tb = 0, error.__traceback__
+    while tb is not None:
+        depth, tb = depth + 1, tb.tb_next
+    return depth
+
+
+def test_cached_failure_raises_a_fresh_error(resolver):
+    first = lookup_error("missing.example")
+    hits = [lookup_error("missing.example") for _ in range(3)]
+    assert resolver == ["missing.example"]
+    for error in hits:
+        assert error is not first
+        assert (error.errno, error.strerror) == (first.errno, first.strerror)
+    # Each hit starts a new traceback instead of extending a shared one.
+    assert len({id(error) for error in hits}) == 3
+    assert len({traceback_depth(error) for error in hits}) == 1
+
+
+def test_temporary_failures_are_not_cached(resolver, monkeypatch):
+    def flaky(host, *args):
+        resolver.append(host)
+        raise socket.gaierror(socket.EAI_AGAIN, "Temporary failure")
+
+    monkeypatch.setattr(dns_cache, "_original_getaddrinfo", flaky)
+    lookup_error("flaky.example")
+    lookup_error("flaky.example")
+    assert resolver == ["flaky.example", "flaky.example"]
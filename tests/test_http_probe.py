@@ -0,0 +1,143 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from m3uchecker import health_check
+from m3uchecker.health_check import (
+    STATUS_ALIVE,
+    STATUS_DEAD,
+    STATUS_UNSTABLE,
+    http_probe,
+)
+
+# Short enough to keep the suite fast, long enough for a loopback reply.
+TIMEOUT = 0.5
+# 188-byte MPEG-TS packets, each starting with the 0x47 sync byte.
+TS_PACKETS = (b"\x47" + b"\x00" * 187) * 8
+
+_release = threading.Event()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/slow-headers":
+            _release.wait(TIMEOUT * 4)
+            self._send(200, "video/mp2t", TS_PACKETS)
+        elif self.path.startswith("/slow-body"):
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp2t")
+            self.end_headers()
+            self.wfile.flush()
+            _release.wait(TIMEOUT * 4)
+        elif self.path == "/html":
+            self._send(200, "text/html; charset=utf-8", b"<html>Not here</html>")
+        elif self.path == "/missing":
+            self._send(404, "text/plain", b"not found")
+        elif self.path == "/ts":
+            self._send(206, "video/mp2t", TS_PACKETS[: health_check.PROBE_HEAD_BYTES])
+        else:
+            self._send(500, "text/plain", b"unexpected path")
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    _release.set()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_slow_headers_are_inconclusive(server):
+    assert http_probe(f"{server}/slow-headers", TIMEOUT) == (None, None)
+
+
+def test_slow_body_is_inconclusive(server):
+    start = time.monotonic()
+    assert http_probe(f"{server}/slow-body", TIMEOUT) == (None, None)
+    assert time.monotonic() - start < TIMEOUT * 3
+
+
+def test_slow_bodies_do_not_trip_the_host_breaker(server):
+    host = server.split("//", 1)[1]
+    host_failures = health_check._HostFailures()
+    # One more counted failure would trip the breaker.
+    for _ in range(health_check.HOST_FAILURE_LIMIT):
+        host_failures.record(host, STATUS_DEAD)
+    for i in range(2):
+        url = f"{server}/slow-body/{i}"
+        assert http_probe(url, TIMEOUT, host_failures) == (None, None)
+    status, diagnostics = http_probe(f"{server}/ts", TIMEOUT, host_failures)
+    assert status == STATUS_ALIVE
+    assert diagnostics["format"] == "mpegts"
+
+
+def test_refused_connections_trip_the_breaker_as_dead():
+    # A port that was just free has nothing listening on it.
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        host = f"127.0.0.1:{sock.getsockname()[1]}"
+    host_failures = health_check._HostFailures()
+    for _ in range(health_check.HOST_FAILURE_LIMIT + 1):
+        result = http_probe(f"http://{host}/", TIMEOUT, host_failures)
+        assert result == (STATUS_DEAD, None)
+    assert host_failures.tripped(host) == STATUS_DEAD
+
+
+def test_breaker_tripped_by_timeouts_reports_unstable(server):
+    host = server.split("//", 1)[1]
+    host_failures = health_check._HostFailures()
+    for _ in range(health_check.HOST_FAILURE_LIMIT + 1):
+        host_failures.record(host, STATUS_UNSTABLE)
+    # Short-circuited: the healthy stream is not even requested.
+    assert http_probe(f"{server}/ts", TIMEOUT, host_failures) == (
+        STATUS_UNSTABLE,
+        None,
+    )
+    host_failures.record(host)
+    assert http_probe(f"{server}/ts", TIMEOUT, host_failures)[0] == STATUS_ALIVE
+
+
+def test_tls_errors_are_inconclusive(server):
+    # Speaking TLS to a plain-HTTP port fails the handshake with SSLError,
+    # like a self-signed or expired certificate does.
+    tls_url = server.replace("http://", "https://") + "/ts"
+    host = server.split("//", 1)[1]
+    host_failures = health_check._HostFailures()
+    for _ in range(health_check.HOST_FAILURE_LIMIT + 1):
+        assert http_probe(tls_url, TIMEOUT, host_failures) == (None, None)
+    assert host_failures.tripped(host) is None
+
+
+def test_html_page_is_dead(server):
+    assert http_probe(f"{server}/html", TIMEOUT) == (STATUS_DEAD, None)
+
+
+def test_client_error_is_dead(server):
+    assert http_probe(f"{server}/missing", TIMEOUT) == (STATUS_DEAD, None)
+
+
+def test_ts_sync_bytes_are_alive(server):
+    status, diagnostics = http_probe(f"{server}/ts", TIMEOUT)
+    assert status == STATUS_ALIVE
+    assert diagnostics == {
+        "probe": "http",
+        "content_type": "video/mp2t",
+        "format": "mpegts",
+    }
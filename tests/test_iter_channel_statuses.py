@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import Counter, namedtuple
+
+import pytest
+
+from m3uchecker import health_check
+from m3uchecker.health_check import STATUS_ALIVE, iter_channel_statuses
+
+Channel = namedtuple("Channel", "url")
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    """Replace the real probe with a short sleep that records concurrency."""
+    lock = threading.Lock()
+    running = Counter()
+    record = {"started": [], "urls": [], "peak": Counter()}
+
+    def fake_status(url, *args):
+        host = health_check._host_key(url)
+        with lock:
+            record["started"].append(host)
+            record["urls"].append(url)
+            running[host] += 1
+            record["peak"][host] = max(record["peak"][host], running[host])
+        time.sleep(0.05)
+        with lock:
+            running[host] -= 1
+        return STATUS_ALIVE
+
+    monkeypatch.setattr(health_check, "get_channel_status", fake_status)
+    monkeypatch.setattr(health_check, "_prefetch_hosts", lambda channels: None)
+    monkeypatch.setattr(health_check, "MAX_INFLIGHT_PER_HOST", 8)
+    return record
+
+
+def check(channels, workers):
+    return dict(
+        iter_channel_statuses(channels, 0, workers, use_cache=False)
+    )
+
+
+def test_single_host_playlist_uses_every_worker(probes):
+    channels = [Channel(f"http://one.example/{i}") for i in range(64)]
+    statuses = check(channels, 32)
+    assert statuses == {i: STATUS_ALIVE for i in range(64)}
+    assert probes["peak"]["one.example"] == 32
+
+
+def test_busy_host_leaves_workers_for_other_hosts(probes):
+    channels = [Channel(f"http://a.example/{i}") for i in range(40)]
+    channels += [Channel(f"http://b.example/{i}") for i in range(40)]
+    statuses = check(channels, 16)
+    assert len(statuses) == 80
+    # The first wave is capped at 8 probes for a, the rest go to b.
+    assert Counter(probes["started"][:16]) == {"a.example": 8, "b.example": 8}
+
+
+def test_duplicate_urls_are_probed_once(probes):
+    channels = [Channel("http://a.example/live"), Channel("HTTP://A.example:80/live")]
+    assert check(channels, 4) == {0: STATUS_ALIVE, 1: STATUS_ALIVE}
+    assert probes["started"] == ["a.example"]
+
+
+def test_equivalent_spellings_are_probed_once(probes):
+    spellings = [
+        "http://a.example/live",
+        "HTTP://A.EXAMPLE/live",
+        "http://a.example:80/live",
+        "http://a.example/live#player",
+    ]
+    root = ["http://b.example", "http://B.example:80/", "http://b.example/#top"]
+    channels = [Channel(url) for url in spellings + root]
+    channels.append(Channel("http://a.example/live?hd=1"))
+    statuses = check(channels, 4)
+    assert statuses == {i: STATUS_ALIVE for i in range(len(channels))}
+    # One probe per distinct stream; the query string is part of it.
+    assert sorted(probes["urls"]) == [
+        "http://a.example/live",
+        "http://a.example/live?hd=1",
+        "http://b.example",
+    ]
@@ -0,0 +1,91 @@
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from m3uchecker import health_check
+from m3uchecker.health_check import load_playlist
+
+PLAYLIST = b"#EXTM3U\n#EXTINF:-1,One\nhttp://a.example/one\n"
+ETAG = '"v1"'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    statuses = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == ETAG:
+            self.statuses.append(304)
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        self.statuses.append(200)
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/x-mpegurl")
+        self.send_header("Content-Length", str(len(PLAYLIST)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(PLAYLIST)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(health_check, "_playlist_cache", OrderedDict())
+
+
+@pytest.fixture
+def server():
+    _Handler.statuses = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/playlist.m3u"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def urls(channels):
+    return [channel.url for channel in channels]
+
+
+def test_unchanged_file_reuses_the_parsed_channels(tmp_path):
+    path = tmp_path / "playlist.m3u"
+    path.write_bytes(PLAYLIST)
+    first = load_playlist(str(path))
+    second = load_playlist(str(path))
+    assert urls(second) == ["http://a.example/one"]
+    assert second[0] is first[0]
+
+
+def test_modified_file_is_parsed_again(tmp_path):
+    path = tmp_path / "playlist.m3u"
+    path.write_bytes(PLAYLIST)
+    assert urls(load_playlist(str(path))) == ["http://a.example/one"]
+    path.write_bytes(PLAYLIST + b"#EXTINF:-1,Two\nhttp://a.example/two\n")
+    assert urls(load_playlist(str(path))) == [
+        "http://a.example/one",
+        "http://a.example/two",
+    ]
+    # Same size, new mtime: still a different file.
+    path.write_bytes(PLAYLIST.replace(b"one", b"uno"))
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert urls(load_playlist(str(path))) == ["http://a.example/uno"]
+
+
+def test_not_modified_response_returns_the_cached_channels(server):
+    first = load_playlist(server)
+    second = load_playlist(server)
+    assert _Handler.statuses == [200, 304]
+    assert urls(second) == ["http://a.example/one"]
+    assert second[0] is first[0]
+    # Callers get their own list and cannot corrupt the memo.
+    second.clear()
+    assert urls(load_playlist(server)) == ["http://a.example/one"]
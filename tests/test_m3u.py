@@ -0,0 +1,69 @@
+import io
+
+import pytest
+
+from m3uchecker.m3u import Channel, iter_m3u, iter_m3u_bytes
+
+PLAYLISTS = {
+    "crlf": (
+        b"#EXTM3U\r\n"
+        b'#EXTINF:-1 tvg-id="one" group-title="News",One\r\n'
+        b"http://a.example/one\r\n"
+        b"#EXTINF:-1,Two\r\n"
+        b"http://a.example/two\r\n"
+    ),
+    "extgrp": (
+        b"#EXTM3U\n"
+        b"#EXTINF:-1,One\n"
+        b"#EXTGRP:Sports\n"
+        b"http://a.example/one\n"
+        b"#EXTINF:-1,Two\n"
+        b"#EXTGRP:  \n"
+        b"http://a.example/two\n"
+    ),
+    "directives_and_blank_lines": (
+        b"#EXTM3U\n"
+        b"\n"
+        b"  #EXTINF:-1 tvg-logo=\"http://a.example/logo.png\",One  \n"
+        b"\n"
+        b"#EXTVLCOPT:http-user-agent=Player\n"
+        b"   \n"
+        b"\t http://a.example/one \n"
+    ),
+    "no_final_newline": (
+        b"#EXTM3U\n"
+        b"#EXTINF:-1,One\n"
+        b"http://a.example/one"
+    ),
+    "orphan_extinf": (
+        b"#EXTM3U\n"
+        b"#EXTINF:-1,Lost\n"
+        b"#EXTINF:-1,Kept\n"
+        b"http://a.example/kept\n"
+        b"#EXTINF:-1,Trailing\n"
+    ),
+    "utf8": (
+        '#EXTM3U\n#EXTINF:-1 tvg-name="Ελληνικά",Télé Ünïcode 頻道\n'
+        "http://a.example/ünï\n"
+    ).encode("utf-8"),
+    "form_feed_line": (
+        b"#EXTM3U\n"
+        b"#EXTINF:-1,One\n"
+        b"\x0c\n"
+        b"\x0b\x1c \n"
+        b"http://a.example/one\n"
+    ),
+}
+
+
+def fields(channel):
+    return tuple(getattr(channel, name) for name in Channel.__slots__)
+
+
+@pytest.mark.parametrize("data", PLAYLISTS.values(), ids=PLAYLISTS.keys())
+def test_text_and_bytes_parsers_agree(data):
+    # Read the text the way open() does, with universal newlines.
+    lines = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")
+    expected = [fields(channel) for channel in iter_m3u(lines)]
+    assert expected
+    assert [fields(channel) for channel in iter_m3u_bytes(data)] == expected
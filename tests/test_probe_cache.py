@@ -0,0 +1,76 @@
+import sqlite3
+import time
+
+import pytest
+
+from m3uchecker import health_check
+from m3uchecker.health_check import STATUS_ALIVE, STATUS_DEAD, STATUS_UNSTABLE
+from m3uchecker.utils import probe_cache
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    """Point the module-level cache at a fresh database for each test."""
+    monkeypatch.setattr(probe_cache, "_conn", None)
+    monkeypatch.setattr(probe_cache, "_fresh", {})
+    monkeypatch.setattr(probe_cache, "_pending", [])
+    path = tmp_path / "probe_cache.sqlite3"
+    conn = probe_cache.open_cache(path)
+    yield path
+    conn.close()
+
+
+def stored_rows(path):
+    with sqlite3.connect(str(path)) as conn:
+        return conn.execute(
+            "SELECT url, status, diagnostics FROM probe_cache ORDER BY url"
+        ).fetchall()
+
+
+def test_flush_writes_a_partial_batch(cache_path):
+    probe_cache.store_result("http://a.example/1", STATUS_ALIVE, {"probe": "http"})
+    probe_cache.store_result("http://a.example/2", STATUS_ALIVE, None)
+    assert stored_rows(cache_path) == []
+    probe_cache.flush()
+    assert stored_rows(cache_path) == [
+        ("http://a.example/1", STATUS_ALIVE, '{"probe": "http"}'),
+        ("http://a.example/2", STATUS_ALIVE, None),
+    ]
+
+
+def test_expired_entry_is_a_miss(cache_path, monkeypatch):
+    probe_cache.store_result("http://a.example/old", STATUS_ALIVE, {"probe": "http"})
+    probe_cache.store_result("http://a.example/new", STATUS_ALIVE, {"probe": "http"})
+    probe_cache.flush()
+    with sqlite3.connect(str(cache_path)) as conn:
+        conn.execute(
+            "UPDATE probe_cache SET ts = ? WHERE url = ?",
+            (time.time() - 120, "http://a.example/old"),
+        )
+    probe_cache.prefetch(60)
+    assert probe_cache.check_cache("http://a.example/old", 60) == (None, None)
+    assert probe_cache.check_cache("http://a.example/new", 60) == (
+        STATUS_ALIVE,
+        {"probe": "http"},
+    )
+    # An entry prefetched while fresh still expires during a long run.
+    stored_at = probe_cache._fresh["http://a.example/new"][2]
+    monkeypatch.setattr(time, "time", lambda: stored_at + 60)
+    assert probe_cache.check_cache("http://a.example/new", 60) == (None, None)
+
+
+def test_only_alive_results_are_stored(cache_path, monkeypatch):
+    results = {
+        "http://a.example/alive": (STATUS_ALIVE, {"probe": "http"}),
+        "http://a.example/dead": (STATUS_DEAD, None),
+        "http://a.example/unstable": (STATUS_UNSTABLE, None),
+    }
+    monkeypatch.setattr(
+        health_check, "_probe_channel", lambda url, *args: results[url]
+    )
+    for url, (status, _) in results.items():
+        assert health_check.get_channel_status(url, 0) == status
+    probe_cache.flush()
+    assert stored_rows(cache_path) == [
+        ("http://a.example/alive", STATUS_ALIVE, '{"probe": "http"}'),
+    ]
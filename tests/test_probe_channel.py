@@ -0,0 +1,65 @@
+import subprocess
+
+import pytest
+
+from m3uchecker import health_check
+from m3uchecker.health_check import STATUS_DEAD, STATUS_UNSTABLE
+
+URL = "http://stream.example/live.ts"
+
+
+@pytest.fixture
+def ffprobe(monkeypatch):
+    """Route ffprobe through a fake subprocess.run; returns the call list."""
+    calls = []
+    outcome = {}
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        if outcome.get("expire"):
+            raise subprocess.TimeoutExpired(cmd, kwargs["timeout"])
+        return subprocess.CompletedProcess(cmd, 1, b"", outcome["stderr"])
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    monkeypatch.setattr(health_check, "av", None)
+    monkeypatch.setattr(health_check, "http_probe", lambda *args: (None, None))
+    return calls, outcome
+
+
+def probe():
+    return health_check._probe_channel(URL, 0, 1, False, None)
+
+
+@pytest.mark.parametrize(
+    "stderr",
+    [
+        b"live.ts: Connection timed out\n",
+        b"tcp: ETIMEDOUT while reading\n",
+    ],
+)
+def test_ffprobe_timeout_is_unstable_without_retries(ffprobe, stderr):
+    calls, outcome = ffprobe
+    outcome["stderr"] = stderr
+    assert probe() == (STATUS_UNSTABLE, None)
+    assert len(calls) == 1
+
+
+def test_subprocess_timeout_is_unstable_without_retries(ffprobe):
+    calls, outcome = ffprobe
+    outcome["expire"] = True
+    assert probe() == (STATUS_UNSTABLE, None)
+    assert len(calls) == 1
+
+
+def test_hard_failure_is_dead_without_retries(ffprobe):
+    calls, outcome = ffprobe
+    outcome["stderr"] = b"live.ts: Server returned 404 Not Found\n"
+    assert probe() == (STATUS_DEAD, None)
+    assert len(calls) == 1
+
+
+def test_other_failures_are_retried_then_dead(ffprobe):
+    calls, outcome = ffprobe
+    outcome["stderr"] = b"live.ts: End of file\n"
+    assert probe() == (STATUS_DEAD, None)
+    assert len(calls) == health_check.RETRIES